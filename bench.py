@@ -0,0 +1,320 @@
+from contextlib import redirect_stdout
+from datetime import date
+from pathlib import Path
+from statistics import mean, median
+from unittest.mock import patch
+from jsoncodec import available_codecs, get_codec
+from models import Task
+from storage import JsonStorage, NdjsonStorage, make_storage
+from utils import TaskManager, render_table
+from logconfig import setup_logging
+import argparse
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import json
+import sys
+import os
+
+
+SIZES = (1000, 10000, 100000, 1000000)
+
+# Weighted so a few categories hold most tasks, like a real list does.
+CATEGORIES = {'Work': 30, 'Home': 20, 'Study': 15, 'Errands': 10, 'Health': 8,
+              'Shopping': 7, 'Finance': 5, 'Travel': 3, 'Hobby': 2}
+PRIORITIES = {'Low': 50, 'Medium': 35, 'High': 15}
+WORDS = ('call', 'buy', 'write', 'fix', 'review', 'plan', 'book', 'pay', 'clean', 'send',
+         'report', 'groceries', 'dentist', 'invoice', 'tickets', 'car', 'email', 'notes')
+
+
+def make_tasks(count, seed=0):
+    rng = random.Random(seed)
+    today = date.today().toordinal()
+    categories = rng.choices(list(CATEGORIES), weights=list(CATEGORIES.values()), k=count)
+    priorities = rng.choices(list(PRIORITIES), weights=list(PRIORITIES.values()), k=count)
+    tasks = []
+    for i in range(count):
+        created = today - int(rng.expovariate(1 / 30))
+        # about a fifth of the deadlines have already passed
+        deadline = today + rng.randint(-30, 7) if rng.random() < 0.2 else today + int(rng.expovariate(1 / 14))
+        text = ' '.join(rng.choices(WORDS, k=rng.randint(1, 6))).capitalize() + f' #{i}'
+        tasks.append(Task(text, categories[i], priorities[i], deadline, done=rng.random() < 0.3, date=created,
+                          id=i + 1))
+    return tasks
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_codecs(sizes, directory):
+    print(f"{'tasks':>9} {'backend':<8} {'codec':<8} {'mode':<8} {'save s':>8} {'load s':>8} {'size MB':>8}")
+    for size in sizes:
+        tasks = make_tasks(size)
+        for backend in (JsonStorage, NdjsonStorage):
+            reference = {}
+            for name in available_codecs():
+                for compact in (False, True):
+                    if backend is NdjsonStorage and not compact:
+                        continue
+                    path = Path(directory, f'{backend.name}-{name}-{int(compact)}.json')
+                    storage = backend(path, get_codec(name, compact))
+                    save_time, _ = timed(storage.save, tasks)
+                    load_time, loaded = timed(storage.load)
+                    assert len(loaded) == size
+
+                    data = path.read_bytes()
+                    if reference.setdefault(compact, data) != data:
+                        print(f'Warning: {name} output differs from {available_codecs()[0]}', file=sys.stderr)
+                    mode = 'compact' if compact else 'indent'
+                    print(f'{size:>9} {backend.name:<8} {name:<8} {mode:<8} {save_time:>8.3f} {load_time:>8.3f} '
+                          f'{len(data) / 1e6:>8.2f}')
+                    path.unlink()
+
+
+def task_file(size, data_dir):
+    # Generated files are kept in data_dir so repeated runs skip generation.
+    path = Path(data_dir, f'tasks-{size}.json')
+    if not path.exists():
+        JsonStorage(path, get_codec('json')).save(make_tasks(size))
+    return path
+
+
+def pick(manager, rng, done=None):
+    ids = [task.id for task in manager.tasks if done is None or task.done == done]
+    return str(rng.choice(ids))
+
+
+# Each operation returns the answers fed to input() and the call to time.
+OPERATIONS = {
+    'load_data': lambda manager, rng: ([], lambda: manager.load_data(force=True)),
+    'save_data': lambda manager, rng: ([], manager.save_data),
+    'add_task': lambda manager, rng: (['Benchmark task', rng.choice(list(CATEGORIES)), '2', '7'], manager.add_task),
+    'complete_task': lambda manager, rng: ([pick(manager, rng, done=False), 'y'], manager.complete_task),
+    'delete_task': lambda manager, rng: ([pick(manager, rng), 'y'], manager.delete_task),
+    'find_by_category': lambda manager, rng: ([rng.choice(list(CATEGORIES))], manager.find_by_category),
+    'find_by_priority': lambda manager, rng: ([str(rng.randint(1, 3))], manager.find_by_priority),
+    'find_overdue_tasks': lambda manager, rng: ([], manager.find_overdue_tasks),
+    'find_due_soon': lambda manager, rng: (['7'], manager.find_due_soon),
+    'search_tasks': lambda manager, rng: ([' '.join(rng.sample(WORDS, 2))], manager.search_tasks),
+    'render_table': lambda manager, rng: ([], lambda: render_table('Tasks list', manager.tasks)),
+    # the typical combined search: urgent, open, due this week, top 20
+    'query_top20': lambda manager, rng: ([], lambda: list(manager.query(
+        priority='High', done=False, due_before=date.today().toordinal() + 7, sort='deadline', limit=20))),
+}
+
+
+def bench_operations(size, source, directory, backend, repeat, operations, seed=0):
+    work_dir = Path(directory, f'{backend}-{size}')
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir()
+    shutil.copy(source, work_dir / 'tasks.json')
+
+    rng = random.Random(seed)
+    manager = TaskManager(make_storage(backend, work_dir / 'tasks.json'))
+    manager.load_data()
+    results = []
+    with open(os.devnull, 'w') as sink, redirect_stdout(sink):
+        for name in operations:
+            runs = []
+            for _ in range(repeat):
+                answers, call = OPERATIONS[name](manager, rng)
+                with patch('builtins.input', side_effect=answers):
+                    elapsed, _ = timed(call)
+                runs.append(elapsed)
+            results.append({
+                'size': size,
+                'operation': name,
+                'runs': runs,
+                'min': min(runs),
+                'median': median(runs),
+                'mean': mean(runs),
+            })
+    manager.close()
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def run_operations(args):
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': args.backend,
+        'codec': get_codec().name,
+        'repeat': args.repeat,
+        'results': [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        data_dir = args.data_dir or directory
+        for size in args.sizes:
+            source = task_file(size, data_dir)
+            results = bench_operations(size, source, directory, args.backend, args.repeat, args.operations)
+            for result in results:
+                print(f"{size:>9} {result['operation']:<20} {result['median']:>10.4f}s median "
+                      f"{result['min']:>10.4f}s min")
+            report['results'].extend(results)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(f'Results written to {args.output}')
+
+
+# Whole runs of main.py in a fresh interpreter, as a user starts them.
+STARTUP_COMMANDS = {
+    'help': ['--help'],
+    'list': ['list'],
+    'add': ['add', 'Benchmark task', '-c', 'Work', '-d', '7'],
+    'find': ['find', '-p', 'High', '--not-done', '-s', 'deadline', '-n', '20'],
+}
+
+# Modules main.py imports only for the commands or settings that use them.
+LAZY_MODULES = ('sqlite3', 'csv', 'colorama', 'search', 'cProfile', 'logging.handlers', 'asyncio', 'socket')
+
+
+def imported_modules(command, cwd, env):
+    # -X importtime lists every module a run imports on stderr
+    result = subprocess.run([sys.executable, '-X', 'importtime', str(Path(__file__).with_name('main.py')), *command],
+                            cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return {line.rsplit('|', 1)[1].strip() for line in result.stderr.splitlines() if line.startswith('import time:')}
+
+
+def bench_startup(size, source, directory, backend, repeat, commands):
+    work_dir = Path(directory, f'startup-{backend}-{size}')
+    shutil.rmtree(work_dir, ignore_errors=True)
+    work_dir.mkdir()
+    shutil.copy(source, work_dir / 'tasks.json')
+    env = dict(os.environ, TODO_STORAGE=backend)
+    env.pop('FORCE_COLOR', None)
+    env.pop('TODO_SOCKET', None)
+
+    results = []
+    for name in commands:
+        command = [sys.executable, str(Path(__file__).with_name('main.py')), *STARTUP_COMMANDS[name]]
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=work_dir, env=env, stdout=subprocess.DEVNULL, check=True)
+            runs.append(time.perf_counter() - start)
+        lazy = set(LAZY_MODULES) - ({'sqlite3'} if backend == 'sqlite' else set())
+        loaded = sorted(lazy & imported_modules(STARTUP_COMMANDS[name], work_dir, env))
+        results.append({
+            'size': size,
+            'operation': f'startup_{name}',
+            'runs': runs,
+            'min': min(runs),
+            'median': median(runs),
+            'mean': mean(runs),
+            'lazy_imports': loaded,
+        })
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def run_startup(args):
+    # Returns the number of commands that imported a module they should not need.
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': args.backend,
+        'codec': get_codec().name,
+        'repeat': args.repeat,
+        'results': [],
+    }
+    unexpected = 0
+    with tempfile.TemporaryDirectory() as directory:
+        data_dir = args.data_dir or directory
+        for size in args.sizes:
+            source = task_file(size, data_dir)
+            results = bench_startup(size, source, directory, args.backend, args.repeat, args.commands)
+            for result in results:
+                flag = ''
+                if result['lazy_imports']:
+                    unexpected += 1
+                    flag = '  imported ' + ', '.join(result['lazy_imports'])
+                print(f"{size:>9} {result['operation']:<20} {result['median']:>10.4f}s median "
+                      f"{result['min']:>10.4f}s min{flag}")
+            report['results'].extend(results)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(f'Results written to {args.output}')
+    return unexpected
+
+
+def compare(baseline_path, current_path, threshold):
+    # Returns the number of operations whose median got slower than threshold allows.
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['size'], r['operation']): r for r in json.load(f)['results']}
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)['results']
+
+    regressions = 0
+    print(f"{'tasks':>9} {'operation':<20} {'baseline s':>11} {'current s':>11} {'ratio':>7}")
+    for result in current:
+        before = baseline.get((result['size'], result['operation']))
+        if before is None:
+            continue
+        ratio = result['median'] / before['median'] if before['median'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            regressions += 1
+            flag = '  REGRESSION'
+        print(f"{result['size']:>9} {result['operation']:<20} {before['median']:>11.4f} {result['median']:>11.4f} "
+              f"{ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench.py', description='Time the To-Do list storage paths.')
+    commands = parser.add_subparsers(dest='command', required=True, metavar='command')
+
+    ops_parser = commands.add_parser('ops', help='time TaskManager operations on synthetic task lists')
+    ops_parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    ops_parser.add_argument('--backend', default='json', help='storage backend, as in TODO_STORAGE')
+    ops_parser.add_argument('--repeat', type=int, default=5)
+    ops_parser.add_argument('--operations', nargs='+', choices=list(OPERATIONS), default=list(OPERATIONS),
+                            metavar='operation')
+    ops_parser.add_argument('--data-dir', help='keep generated task files here and reuse them')
+    ops_parser.add_argument('-o', '--output', default='bench-results.json')
+
+    startup_parser = commands.add_parser('startup', help='time main.py commands from a cold interpreter')
+    startup_parser.add_argument('--sizes', type=int, nargs='+', default=[0, 1000, 10000])
+    startup_parser.add_argument('--backend', default='json', help='storage backend, as in TODO_STORAGE')
+    startup_parser.add_argument('--repeat', type=int, default=11)
+    startup_parser.add_argument('--commands', nargs='+', choices=list(STARTUP_COMMANDS),
+                                default=list(STARTUP_COMMANDS), metavar='command')
+    startup_parser.add_argument('--data-dir', help='keep generated task files here and reuse them')
+    startup_parser.add_argument('-o', '--output', default='bench-startup.json')
+
+    compare_parser = commands.add_parser('compare', help='compare two ops result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=1.25,
+                                help='flag operations whose median grew by more than this factor')
+
+    codecs_parser = commands.add_parser('codecs', help='compare JSON codecs when saving and loading tasks')
+    codecs_parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    args = parser.parse_args(argv)
+    setup_logging()
+
+    if args.command == 'ops':
+        run_operations(args)
+    elif args.command == 'startup':
+        return 1 if run_startup(args) else 0
+    elif args.command == 'compare':
+        return 1 if compare(args.baseline, args.current, args.threshold) else 0
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            bench_codecs(args.sizes, directory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,229 @@
+from pathlib import Path
+from models import Task
+from jsoncodec import get_codec
+from storage import list_path
+from utils import PAGE_SIZE, TaskManager
+from itertools import islice
+import logging
+import os
+
+
+# Tasks per import request, which keeps every request line well below the
+# daemon's limit.
+IMPORT_CHUNK = 1000
+
+
+def socket_path():
+    # one daemon per list, so by default the socket sits next to it
+    if os.environ.get('TODO_SOCKET'):
+        return Path(os.environ['TODO_SOCKET'])
+    return list_path().with_suffix('.sock')
+
+
+def connect(path=None):
+    # Returns a RemoteTaskManager when a daemon is listening on path, else None.
+    path = socket_path() if path is None else Path(path)
+    if not path.exists():
+        return None
+    import socket
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(str(path))
+    except OSError as e:
+        # left behind by a daemon that did not shut down cleanly
+        logging.debug("No daemon on %s: %s", path, e)
+        connection.close()
+        return None
+    logging.debug("Connected to daemon on %s", path)
+    return RemoteTaskManager(connection)
+
+
+
+
+class RemoteTaskManager(TaskManager):
+    # Sends every operation to the daemon (see daemon.py), which keeps the one
+    # in-memory copy of the tasks and logs the changes. Nothing is read from
+    # the tasks file; the full list is only fetched when something asks for
+    # it, and again only after the daemon's copy changed. The menu actions
+    # work unchanged on top of these methods.
+    def __init__(self, connection):
+        self.connection = connection
+        self.stream = connection.makefile('rb')
+        self.codec = get_codec(compact=True)
+        self.storage = None
+        self.metrics = None
+        self.reminder = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._view = None
+        self._by_id = None
+        self._version = None
+
+
+    def call(self, op, **args):
+        # One JSON object per line each way; errors come back as ValueError.
+        self.connection.sendall(self.codec.encode({'op': op, **args}) + b'\n')
+        line = self.stream.readline()
+        if not line:
+            raise ConnectionError('The daemon closed the connection')
+        response = self.codec.decode(line)
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['result']
+
+
+
+
+    def load_data(self, force=False):
+        version = self.call('version')
+        if force or version != self._version:
+            self.cache_misses += 1
+            self._view = self._by_id = None
+            self._version = version
+        else:
+            self.cache_hits += 1
+
+
+
+
+    def _fetch(self):
+        if self._view is None:
+            self._view = [Task.from_dict(data) for data in self.call('list')]
+            self._by_id = {task.id: task for task in self._view}
+
+
+
+
+    @property
+    def tasks(self):
+        self._fetch()
+        return self._view
+
+
+
+
+    @property
+    def by_id(self):
+        self._fetch()
+        return self._by_id
+
+
+
+
+    def _changed(self):
+        # the daemon's copy moved on; fetch the list again when it is next read
+        self._view = self._by_id = None
+        self._version = None
+
+
+
+
+    def save_data(self):
+        # returns once everything sent so far has been committed
+        self.call('save')
+
+
+
+
+    def create_task(self, text, category, priority, days_until_deadline):
+        task = Task.from_dict(self.call('add', text=text, category=category, priority=priority,
+                                        days=days_until_deadline))
+        self._changed()
+        return task
+
+
+
+
+    def import_tasks(self, tasks):
+        # Read everything first, so a bad row leaves the list untouched.
+        rows = iter([task.to_dict() for task in tasks])
+        count = 0
+        while chunk := list(islice(rows, IMPORT_CHUNK)):
+            count += self.call('import', tasks=chunk)
+        self._changed()
+        return count
+
+
+
+
+    def remove_tasks(self, ids):
+        removed = [Task.from_dict(data) for data in self.call('delete', ids=list(ids))]
+        self._changed()
+        return removed
+
+
+
+
+    def complete_tasks(self, ids):
+        completed = [Task.from_dict(data) for data in self.call('complete', ids=list(ids))]
+        self._changed()
+        return completed
+
+
+
+
+    def task_count(self):
+        # the menu checks for an empty list first; that should not fetch it
+        if self._view is not None:
+            return len(self._view)
+        return self.call('count')
+
+
+
+
+    def unknown_ids(self, ids):
+        return self.call('unknown', ids=list(ids))
+
+
+
+
+    def query(self, category=None, priority=None, done=None, due_before=None, text_contains=None, sort=None,
+              limit=None, due_from=None):
+        found = self.call('query', category=category, priority=priority, done=done, due_before=due_before,
+                          due_from=due_from, text_contains=text_contains, sort=sort, limit=limit)
+        return map(Task.from_dict, found)
+
+
+
+
+    def search(self, text, limit=None):
+        return [Task.from_dict(data) for data in self.call('search', text=text, limit=limit)]
+
+
+
+
+    def statistics(self):
+        return self.call('stats')
+
+
+
+
+    def overdue_tasks(self):
+        return [Task.from_dict(data) for data in self.call('overdue')]
+
+
+
+
+    def due_within(self, days):
+        return [Task.from_dict(data) for data in self.call('due_within', days=days)]
+
+
+
+
+    def start_reminders(self):
+        logging.info("Reminders are announced by the daemon")
+
+
+
+
+    def show_tasks(self, page_size=PAGE_SIZE, stream=False):
+        # there is no file to stream from; pages come from the fetched list
+        self.load_data()
+        super().show_tasks(page_size)
+
+
+
+
+    def close(self):
+        self.stream.close()
+        self.connection.close()
@@ -0,0 +1,236 @@
+from pathlib import Path
+from client import connect, socket_path
+from models import Task
+from jsoncodec import get_codec
+from utils import TaskManager
+import asyncio
+import logging
+import signal
+import os
+
+
+# How long a write waits for others to join its commit, in milliseconds.
+COMMIT_DELAY = float(os.environ.get('TODO_COMMIT_DELAY', 2))
+# Longest request line accepted; clients send imports in smaller chunks.
+LINE_LIMIT = 16 << 20
+
+
+class BatchingTaskManager(TaskManager):
+    # Changes are applied in memory straight away, as usual, but are only
+    # written to storage by commit(), all of them in one record_many call.
+    def __init__(self, storage=None):
+        super().__init__(storage)
+        self.pending = []
+
+
+    def _record_many(self, records):
+        self.pending.extend(records)
+
+
+
+
+    def _data_stamp(self):
+        # Files stamped for the data on disk lack the pending changes, so none
+        # of them match until those are committed.
+        return None if self.pending else super()._data_stamp()
+
+
+
+
+    def commit(self):
+        records, self.pending = self.pending, []
+        super()._record_many(records)
+
+
+
+
+    def save_data(self):
+        # pending changes would be lost if another process's writes were loaded
+        self.commit()
+        super().save_data()
+
+
+
+
+    def query(self, *args, **kwargs):
+        # A query pushed down to the database cannot see the pending changes,
+        # and its ids may no longer be loaded, so they are committed first.
+        if self.pending and self.index is None:
+            self.commit()
+        return super().query(*args, **kwargs)
+
+
+
+
+# Operations a client can send, as {"op": name, ...arguments}. Reads are
+# answered from memory; writes are answered once they have been committed.
+READS = {
+    'list': lambda manager: manager.tasks,
+    'count': lambda manager: manager.task_count(),
+    'query': lambda manager, **criteria: list(manager.query(**criteria)),
+    'search': lambda manager, text, limit=None: manager.search(text, limit),
+    'overdue': lambda manager: manager.overdue_tasks(),
+    'due_within': lambda manager, days: manager.due_within(days),
+    'unknown': lambda manager, ids: manager.unknown_ids(ids),
+    'stats': lambda manager: manager.statistics(),
+}
+WRITES = {
+    'add': lambda manager, text, category, priority, days: manager.create_task(text, category, priority, days),
+    'import': lambda manager, tasks: manager.import_tasks(map(Task.from_dict, tasks)),
+    'delete': lambda manager, ids: manager.remove_tasks(ids),
+    'complete': lambda manager, ids: manager.complete_tasks(ids),
+    'save': lambda manager: None,
+}
+
+
+def dump(result):
+    if isinstance(result, Task):
+        return result.to_dict()
+    if isinstance(result, list):
+        return [dump(item) for item in result]
+    return result
+
+
+class TaskDaemon:
+    # Serves one TaskManager to any number of clients over a Unix socket,
+    # one JSON object per line each way. Everything runs on the event loop
+    # thread, so requests never interleave inside the manager.
+    def __init__(self, manager, path, commit_delay=COMMIT_DELAY):
+        self.manager = manager
+        self.path = Path(path)
+        self.commit_delay = commit_delay / 1000
+        self.codec = get_codec(compact=True)
+        # bumped on every change, so clients know when to fetch the list again
+        self.version = 0
+        self.commits = 0
+        self.clients = set()
+        # writes that have not been answered yet
+        self.writing = 0
+        self._commit = None
+
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        server = await asyncio.start_unix_server(self.handle, path=str(self.path), limit=LINE_LIMIT)
+        # only processes of the same user may talk to it
+        self.path.chmod(0o600)
+        logging.info("Daemon serving %s tasks on %s", len(self.manager.tasks), self.path)
+        print(f'Serving {len(self.manager.tasks)} tasks on {self.path}, press Ctrl+C to stop...')
+
+        await stop.wait()
+        server.close()
+        # commit what is pending now and let those writes answer before closing
+        self.commit()
+        while self.writing:
+            await asyncio.sleep(0)
+        for writer in list(self.clients):
+            writer.close()
+        logging.info("Daemon stopped after %s commits", self.commits)
+
+
+    async def handle(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while line := await reader.readline():
+                writer.write(self.codec.encode(await self.respond(line)) + b'\n')
+                await writer.drain()
+
+        except ValueError as e:
+            # Longer than LINE_LIMIT. The rest of the line cannot be told apart
+            # from the next request, so the client gets an error and is dropped.
+            logging.warning("Daemon request too large: %s", e)
+            writer.write(self.codec.encode({'error': f'Request too large: {e}'}) + b'\n')
+            await writer.drain()
+
+        except ConnectionError:
+            pass
+
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+
+    async def respond(self, line):
+        try:
+            request = self.codec.decode(line)
+            op = request.pop('op', None)
+            self.refresh()
+            if op == 'version':
+                return {'result': self.version}
+            if op in READS:
+                return {'result': dump(READS[op](self.manager, **request))}
+            if op not in WRITES:
+                raise ValueError(f'Unknown operation: {op}')
+            result = WRITES[op](self.manager, **request)
+            self.version += 1
+            self.writing += 1
+            try:
+                # shielded, so a client that goes away cannot cancel the others' commit
+                await asyncio.shield(self.committed())
+            finally:
+                self.writing -= 1
+            # rebasing on a commit may have given new tasks other ids
+            return {'result': dump(result)}
+
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning("Daemon request failed: %s", e)
+            return {'error': str(e)}
+
+
+    def refresh(self):
+        # Picks up writes made to the file by processes that bypass the daemon.
+        # Skipped while changes wait for a commit, as reloading would drop them.
+        if self._commit is None:
+            misses = self.manager.cache_misses
+            self.manager.load_data()
+            if self.manager.cache_misses != misses:
+                self.version += 1
+
+
+    def committed(self):
+        # Every write waits for the same commit, which runs commit_delay after
+        # the first of them, so a burst of writes is saved once. Writes that
+        # arrive while it is saving wait for the next one.
+        if self._commit is None:
+            loop = asyncio.get_running_loop()
+            self._commit = loop.create_future()
+            loop.call_later(self.commit_delay, self.commit)
+        return self._commit
+
+
+    def commit(self):
+        future, self._commit = self._commit, None
+        if future is None:
+            return
+        logging.debug("Committing %s change(s)", len(self.manager.pending))
+        try:
+            self.manager.commit()
+            self.commits += 1
+        finally:
+            future.set_result(None)
+
+
+
+
+def run_daemon(path=None, commit_delay=COMMIT_DELAY):
+    path = socket_path() if path is None else Path(path)
+    running = connect(path)
+    if running is not None:
+        running.close()
+        raise ValueError(f'A daemon is already serving {path}')
+    # a socket file left by a daemon that was killed
+    path.unlink(missing_ok=True)
+
+    manager = BatchingTaskManager()
+    manager.load_data()
+    manager.start_reminders()
+    daemon = TaskDaemon(manager, path, commit_delay)
+    try:
+        asyncio.run(daemon.serve())
+    finally:
+        manager.commit()
+        manager.close()
+        path.unlink(missing_ok=True)
@@ -0,0 +1,134 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+from itertools import chain, islice
+import logging
+
+
+class TaskIndex:
+    # Maps field values to sets of task ids. Ids only grow and new tasks go to
+    # the end of the list, so sorting matching ids gives them in list order.
+    # Tasks with a deadline are also kept in a list sorted by deadline.
+    def __init__(self):
+        self.size = 0
+        self.by_category = defaultdict(set)
+        self.by_priority = defaultdict(set)
+        self.by_done = {False: set(), True: set()}
+        self.deadlines = []
+        self.undated = set()
+        self.last_plan = None
+
+
+    def rebuild(self, tasks):
+        self.__init__()
+        self.extend(tasks)
+        logging.debug("Built indexes for %s tasks", self.size)
+
+
+    def extend(self, tasks):
+        # Bulk version of add(): one sort at the end instead of an insort per task.
+        for task in tasks:
+            self._insert(task)
+            if isinstance(task.deadline, int):
+                self.deadlines.append((task.deadline, task.id))
+            else:
+                self.undated.add(task.id)
+                logging.error('Invalid deadline format in task "%s"', task.text)
+        self.deadlines.sort()
+
+
+    def _insert(self, task):
+        self.size += 1
+        self.by_category[task.category.lower()].add(task.id)
+        self.by_priority[task.priority].add(task.id)
+        self.by_done[bool(task.done)].add(task.id)
+
+
+    def add(self, task):
+        self._insert(task)
+        if isinstance(task.deadline, int):
+            insort(self.deadlines, (task.deadline, task.id))
+        else:
+            self.undated.add(task.id)
+
+
+    def remove(self, task):
+        self.size -= 1
+        self._discard(self.by_category, task.category.lower(), task.id)
+        self._discard(self.by_priority, task.priority, task.id)
+        self.by_done[bool(task.done)].discard(task.id)
+
+        if isinstance(task.deadline, int):
+            entry = (task.deadline, task.id)
+            position = bisect_left(self.deadlines, entry)
+            if position < len(self.deadlines) and self.deadlines[position] == entry:
+                self.deadlines.pop(position)
+        else:
+            self.undated.discard(task.id)
+
+
+    def complete(self, task):
+        self.by_done[False].discard(task.id)
+        self.by_done[True].add(task.id)
+
+
+    @staticmethod
+    def _discard(index, value, key):
+        keys = index.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+
+    def plan(self, category=None, priority=None, done=None, due_before=None, sort=None, limit=None, due_from=None):
+        # Picks the source that yields the fewest candidate ids for a query and
+        # returns (ids, presorted). The caller still checks every criterion on
+        # each candidate. ids None means walking the whole list. Without a sort,
+        # ids come in list order; presorted means they already come in the
+        # order the sort asks for.
+        sources = []
+        if category is not None:
+            sources.append(('category', self.by_category.get(category.lower(), set())))
+        if priority is not None:
+            sources.append(('priority', self.by_priority.get(priority, set())))
+        if done is not None:
+            sources.append(('done', self.by_done[bool(done)]))
+        bounded = due_before is not None or due_from is not None
+        begin = 0 if due_from is None else bisect_left(self.deadlines, (due_from,))
+        end = len(self.deadlines) if due_before is None else max(begin, bisect_left(self.deadlines, (due_before,)))
+
+        name, ids = min(sources, key=lambda source: len(source[1]), default=('all', None))
+        cost = self.size if ids is None else len(ids)
+
+        # A walk that already yields the requested order can stop after limit
+        # matches, which takes about limit / selectivity tasks if the criteria
+        # are independent.
+        selectivity = 1.0
+        for _, source in sources:
+            selectivity *= len(source) / self.size if self.size else 0
+        in_order = sort in (None, 'id')
+        if in_order and limit is not None and ids is not None:
+            if bounded:
+                selectivity *= (end - begin) / self.size if self.size else 0
+            if selectivity and limit / selectivity < cost:
+                self.last_plan = 'all'
+                return None, True
+
+        walk_cost = end - begin if bounded else None
+        if sort == 'deadline':
+            walk_cost = end - begin if bounded else self.size
+            if limit is not None and selectivity:
+                walk_cost = min(walk_cost, limit / selectivity)
+
+        if walk_cost is not None and walk_cost < cost:
+            self.last_plan = 'deadline'
+            walk = (task_id for _, task_id in islice(self.deadlines, begin, end))
+            if sort == 'deadline':
+                # tasks with unparsed deadlines sort last
+                return (walk if bounded else chain(walk, sorted(self.undated))), True
+            return (sorted(walk) if in_order else walk), in_order
+
+        self.last_plan = name
+        if ids is None or not in_order:
+            return ids, in_order
+        return sorted(ids), True
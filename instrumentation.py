@@ -0,0 +1,188 @@
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from pathlib import Path
+from types import GeneratorType
+import logging
+import atexit
+import math
+import time
+import json
+import sys
+import os
+
+
+STORAGE_METHODS = ('load', 'iter_tasks', 'save', 'record_many', 'query')
+
+# Set by enable(); TaskManager instruments itself when this is not None.
+metrics = None
+
+
+def percentile(samples, fraction):
+    # samples must be sorted; nearest-rank method
+    if not samples:
+        return 0.0
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+
+class Metrics:
+    def __init__(self, profile_dir=None):
+        self.timings = defaultdict(list)
+        self.bytes_read = defaultdict(int)
+        self.bytes_written = defaultdict(int)
+        self.scanned = defaultdict(int)
+        self.returned = defaultdict(int)
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.profiles = 0
+
+
+    def add_scan(self, name, scanned, returned):
+        self.scanned[name] += scanned
+        self.returned[name] += returned
+
+
+    def timed(self, name, function, storage=None):
+        # Wraps a callable with a timer. For storage methods, the change in the
+        # storage byte counters during the call is charged to the method.
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            counters = (storage.bytes_read, storage.bytes_written) if storage is not None else None
+            start = time.perf_counter()
+            lazy = False
+            try:
+                result = function(*args, **kwargs)
+                if isinstance(result, GeneratorType):
+                    lazy = True
+                    return self._consume(name, result, time.perf_counter() - start, storage, counters)
+                return result
+            finally:
+                if not lazy:
+                    self._record(name, time.perf_counter() - start, storage, counters)
+        return wrapper
+
+
+    def _consume(self, name, generator, elapsed, storage, counters):
+        # A generator does its work as the caller iterates, so the time spent
+        # producing each item is added up and the call recorded once it is
+        # exhausted or dropped. Time the caller spends on the items is not.
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield item
+        finally:
+            generator.close()
+            self._record(name, elapsed, storage, counters)
+
+
+    def _record(self, name, elapsed, storage, counters):
+        self.timings[name].append(elapsed)
+        if storage is not None:
+            read, written = counters
+            self.bytes_read[name] += storage.bytes_read - read
+            self.bytes_written[name] += storage.bytes_written - written
+
+
+    @contextmanager
+    def profile(self, name):
+        # One file per command or menu action, covering everything it does,
+        # rendering included.
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self.profiles += 1
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(self.profile_dir / f'{self.profiles:04d}-{name}.prof')
+
+
+    def summary(self):
+        report = {}
+        for name, samples in sorted(self.timings.items()):
+            samples = sorted(samples)
+            entry = {
+                'calls': len(samples),
+                'total_ms': sum(samples) * 1000,
+                'p50_ms': percentile(samples, 0.50) * 1000,
+                'p95_ms': percentile(samples, 0.95) * 1000,
+                'p99_ms': percentile(samples, 0.99) * 1000,
+                'max_ms': samples[-1] * 1000,
+            }
+            if name in self.bytes_read or name in self.bytes_written:
+                entry['bytes_read'] = self.bytes_read[name]
+                entry['bytes_written'] = self.bytes_written[name]
+            if name in self.scanned:
+                entry['tasks_scanned'] = self.scanned[name]
+                entry['tasks_returned'] = self.returned[name]
+            report[name] = entry
+        return report
+
+
+    def render(self, out=None):
+        rows = self.summary()
+        if not rows:
+            print('Error: No calls recorded yet.')
+            return
+
+        name_width = max(len(name) for name in rows)
+        lines = [
+            '',
+            f'{"Operation":<{name_width}} | {"Calls":>6} | {"p50 ms":>9} | {"p95 ms":>9} | {"p99 ms":>9} | '
+            f'{"Read KB":>9} | {"Written KB":>10} | {"Scanned":>9} | {"Returned":>9}',
+        ]
+        lines.append('-' * len(lines[-1]))
+        for name, entry in rows.items():
+            lines.append(
+                f'{name:<{name_width}} | {entry["calls"]:>6} | {entry["p50_ms"]:>9.3f} | {entry["p95_ms"]:>9.3f} | '
+                f'{entry["p99_ms"]:>9.3f} | {entry.get("bytes_read", 0) / 1024:>9.1f} | '
+                f'{entry.get("bytes_written", 0) / 1024:>10.1f} | {entry.get("tasks_scanned", ""):>9} | '
+                f'{entry.get("tasks_returned", ""):>9}')
+        lines.append('')
+        (out or sys.stdout).write('\n'.join(lines))
+
+
+    def dump(self, path):
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.summary(), f, indent=4)
+            logging.info("Wrote instrumentation stats to %s", path)
+
+        except OSError as e:
+            logging.error("Failed to write instrumentation stats to %s: %s", path, e)
+
+
+
+
+def enable(profile_dir=None, dump_path=None):
+    global metrics
+    if metrics is None:
+        metrics = Metrics(profile_dir or os.environ.get('TODO_PROFILE_DIR'))
+        atexit.register(metrics.dump, dump_path or os.environ.get('TODO_STATS_FILE', 'todo-stats.json'))
+    return metrics
+
+
+def profiled(name):
+    # cProfile around a block when --profile or TODO_PROFILE_DIR is set
+    if metrics is None or metrics.profile_dir is None:
+        return nullcontext()
+    return metrics.profile(name)
+
+
+def instrument(manager):
+    # Replaces the public methods of one TaskManager, and the I/O methods of its
+    # storage, with timed wrappers. Instances created while disabled pay nothing.
+    for name in dir(type(manager)):
+        if not name.startswith('_') and callable(getattr(type(manager), name)):
+            setattr(manager, name, metrics.timed(name, getattr(manager, name)))
+
+    storage = manager.storage
+    for name in STORAGE_METHODS:
+        setattr(storage, name, metrics.timed(f'storage.{name}', getattr(storage, name), storage))
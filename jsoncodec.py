@@ -0,0 +1,147 @@
+from importlib.util import find_spec
+import logging
+import json
+import os
+import re
+
+# orjson and msgspec are only imported when a codec that uses them is created;
+# msgspec alone takes longer to import than the rest of the program.
+orjson = None
+msgspec = None
+
+
+# Every codec writes exactly what the stdlib writes with ensure_ascii=False,
+# either compact or with indent=4, so a file does not change when the codec does.
+_INDENT = b'\n    '
+_ORJSON_INDENT = re.compile(rb'(?m)^((?:  )+)')
+
+
+class StdlibCodec:
+    name = 'json'
+
+    def __init__(self, compact=False):
+        self.compact = compact
+
+
+    def encode(self, data) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+    def encode_pretty(self, data) -> bytes:
+        return json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8')
+
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+    def encode_array(self, items):
+        # Yields the array piece by piece so large lists are never encoded in one
+        # buffer. Items are nested one level deep, hence the extra indentation.
+        if self.compact:
+            opening, separator, closing = b'[', b',', b']'
+        else:
+            opening, separator, closing = b'[\n    ', b',\n    ', b'\n]'
+
+        prefix = opening
+        for item in items:
+            chunk = self.encode(item) if self.compact else self.encode_pretty(item).replace(b'\n', _INDENT)
+            yield prefix + chunk
+            prefix = separator
+        yield b'[]' if prefix is opening else closing
+
+
+
+
+class OrjsonCodec(StdlibCodec):
+    name = 'orjson'
+
+    def __init__(self, compact=False):
+        super().__init__(compact)
+        global orjson
+        import orjson
+
+    def encode(self, data) -> bytes:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # lone surrogates and integers wider than 64 bits
+            return super().encode(data)
+
+
+    def encode_pretty(self, data) -> bytes:
+        try:
+            encoded = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        except TypeError:
+            return super().encode_pretty(data)
+        if b'\n    ' in encoded:
+            return _ORJSON_INDENT.sub(rb'\1\1', encoded)
+        # flat objects only have one level to widen, and the regex is much slower
+        return encoded.replace(b'\n  ', b'\n    ')
+
+
+    def decode(self, data):
+        return orjson.loads(data)
+
+
+
+
+class MsgspecCodec(StdlibCodec):
+    name = 'msgspec'
+
+    def __init__(self, compact=False):
+        super().__init__(compact)
+        global msgspec
+        import msgspec
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+
+    def encode(self, data) -> bytes:
+        try:
+            return self._encoder.encode(data)
+        except (TypeError, msgspec.EncodeError):
+            return super().encode(data)
+
+
+    def encode_pretty(self, data) -> bytes:
+        return msgspec.json.format(self.encode(data), indent=4)
+
+
+    def decode(self, data):
+        return self._decoder.decode(data)
+
+
+
+
+CODECS = {
+    StdlibCodec.name: StdlibCodec,
+    OrjsonCodec.name: OrjsonCodec,
+    MsgspecCodec.name: MsgspecCodec,
+}
+
+
+def available_codecs():
+    # checks what is installed without importing it
+    names = [StdlibCodec.name]
+    if find_spec('orjson') is not None:
+        names.append(OrjsonCodec.name)
+    if find_spec('msgspec') is not None:
+        names.append(MsgspecCodec.name)
+    return names
+
+
+def get_codec(name=None, compact=None):
+    name = (name or os.environ.get('TODO_JSON_CODEC', 'auto')).lower()
+    if compact is None:
+        compact = os.environ.get('TODO_JSON_COMPACT') == '1'
+
+    available = available_codecs()
+    if name == 'auto':
+        name = 'orjson' if 'orjson' in available else 'msgspec' if 'msgspec' in available else 'json'
+    if name not in CODECS:
+        raise ValueError(f'Unknown JSON codec: {name}')
+    if name not in available:
+        logging.warning("JSON codec %s is not installed, falling back to json", name)
+        name = 'json'
+    return CODECS[name](compact)
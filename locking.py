@@ -0,0 +1,95 @@
+from pathlib import Path
+import threading
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks on this platform; the generation counter still works.
+    fcntl = None
+
+
+class FileLock:
+    # Advisory flock on a sidecar file: shared for readers, exclusive for
+    # writers. Nested acquisitions in one process reuse the outer lock, and the
+    # sidecar also holds the generation counter of the data it guards and the
+    # highest task id handed out.
+    def __init__(self, path):
+        self.path = Path(path)
+        self._fd = None
+        self._depth = 0
+        self._exclusive = False
+        self._thread_lock = threading.RLock()
+
+
+    def shared(self):
+        return _Held(self, False)
+
+
+    def exclusive(self):
+        return _Held(self, True)
+
+
+    def _acquire(self, exclusive):
+        self._thread_lock.acquire()
+        try:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None and (self._depth == 0 or (exclusive and not self._exclusive)):
+                # upgrading shared to exclusive is not atomic, so callers take
+                # the exclusive lock first when they mean to write
+                fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        except BaseException:
+            if self._depth == 0:
+                self._close()
+            self._thread_lock.release()
+            raise
+        self._exclusive = self._exclusive or exclusive
+        self._depth += 1
+
+
+    def _release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._close()
+        self._thread_lock.release()
+
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)  # also drops the flock
+            self._fd = None
+        self._exclusive = False
+
+
+    def read_state(self):
+        # "<generation> <last id>"; sidecars written before ids were tracked
+        # only hold the generation
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        fields = [int(field) if field.isdigit() else 0 for field in os.read(self._fd, 64).split()]
+        generation, last_id = (fields + [0, 0])[:2]
+        return generation, last_id
+
+
+    def write_state(self, generation, last_id):
+        data = f'{generation} {last_id}'.encode()
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, data)
+        os.ftruncate(self._fd, len(data))
+
+
+
+
+class _Held:
+    def __init__(self, lock, exclusive):
+        self.lock = lock
+        self.exclusive = exclusive
+
+
+    def __enter__(self):
+        self.lock._acquire(self.exclusive)
+        return self.lock
+
+
+    def __exit__(self, *exc_info):
+        self.lock._release()
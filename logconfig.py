@@ -0,0 +1,101 @@
+import logging
+import threading
+import atexit
+import queue
+import os
+
+
+LOG_FORMAT = '[%(asctime)s] %(levelname)s: %(message)s'
+
+_handler = None
+
+
+class DeferredQueueHandler(logging.Handler):
+    # The calling thread only puts records on a queue; a background thread
+    # formats them and writes them to the log file. The thread and the file
+    # wait for the first record, so a run that logs nothing at the configured
+    # level pays for neither.
+    def __init__(self, filename, max_bytes, backups):
+        super().__init__()
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.SimpleQueue()
+        self.writer = None
+
+
+    def emit(self, record):
+        if self.writer is None:
+            self.writer = threading.Thread(target=self._write, name='log-writer', daemon=True)
+            self.writer.start()
+        self.queue.put_nowait(record)
+
+
+    def _write(self):
+        # A plain FileHandler until the file reaches max_bytes; only then is
+        # logging.handlers (and the socket module it pulls in) imported to
+        # rotate it.
+        file_handler = logging.FileHandler(self.filename, encoding='utf-8', delay=True)
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        rotating = False
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            file_handler.handle(record)
+            if (not rotating and self.max_bytes > 0 and file_handler.stream is not None
+                    and file_handler.stream.tell() >= self.max_bytes):
+                from logging.handlers import RotatingFileHandler
+                file_handler.close()
+                file_handler = RotatingFileHandler(self.filename, maxBytes=self.max_bytes,
+                                                   backupCount=self.backups, encoding='utf-8', delay=True)
+                file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+                rotating = True
+        file_handler.close()
+
+
+    def close(self):
+        # Flushes whatever is still queued.
+        if self.writer is not None:
+            self.queue.put_nowait(None)
+            self.writer.join()
+            self.writer = None
+        super().close()
+
+
+
+
+def setup_logging(level=None, filename=None):
+    global _handler
+    if _handler is not None:
+        return _handler
+
+    level = (level or os.environ.get('TODO_LOG_LEVEL', 'INFO')).upper()
+    if not isinstance(logging.getLevelName(level), int):
+        level = 'INFO'
+
+    # LOG_FORMAT uses none of the caller, thread or process fields, so skip
+    # collecting them for every record.
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    _handler = DeferredQueueHandler(
+        filename or os.environ.get('TODO_LOG_FILE', 'todo.log'),
+        int(os.environ.get('TODO_LOG_MAX_BYTES', 1 << 20)),
+        int(os.environ.get('TODO_LOG_BACKUPS', 3))
+    )
+    root.addHandler(_handler)
+    atexit.register(stop_logging)
+    return _handler
+
+
+def stop_logging():
+    global _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler.close()
+        _handler = None
@@ -1,4 +1,291 @@
-from cli import menu
-
-
-menu()
\ No newline at end of file
+from ordering import SORT_KEYS
+import argparse
+import time
+import sys
+import os
+
+
+# Everything else is imported by the code that needs it, so --help and a
+# mistyped command only pay for argparse.
+
+PRIORITIES = ('Low', 'Medium', 'High')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='main.py',
+        description='Command-line To-Do list manager. Run without a command to open the interactive menu.')
+    parser.add_argument('--log-level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'), type=str.upper,
+                        help='overrides TODO_LOG_LEVEL (default INFO)')
+    parser.add_argument('--instrument', action='store_true',
+                        help='time every operation and write the results to todo-stats.json on exit')
+    parser.add_argument('--profile', metavar='DIR', help='also save a cProfile file per command into DIR')
+    parser.add_argument('--remind', action='store_true',
+                        help='announce tasks in the menu as they become overdue (or set TODO_REMINDERS=1)')
+    parser.add_argument('--no-daemon', dest='daemon', action='store_false',
+                        help='read the tasks file even when a daemon is running')
+    parser.add_argument('--root', metavar='DIR', help='directory holding the lists (or set TODO_ROOT)')
+    parser.add_argument('--list', metavar='NAME', help='name of the list to use, default tasks (or set TODO_LIST)')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    add_parser = commands.add_parser('add', help='add a new task')
+    add_parser.add_argument('text')
+    add_parser.add_argument('-c', '--category', required=True)
+    add_parser.add_argument('-p', '--priority', choices=PRIORITIES, default='Low')
+    add_parser.add_argument('-d', '--days', type=int, default=0, help='days until the deadline')
+
+    list_parser = commands.add_parser('list', help='show tasks')
+    list_parser.add_argument('--page', type=int, help='show only this page')
+    list_parser.add_argument('--page-size', type=int, default=20)
+    list_parser.add_argument('--stream', action='store_true', help='read tasks straight from storage')
+
+    complete_parser = commands.add_parser('complete', help='mark tasks as completed')
+    complete_parser.add_argument('numbers', type=int, nargs='+', metavar='number')
+
+    delete_parser = commands.add_parser('delete', help='delete tasks')
+    delete_parser.add_argument('numbers', type=int, nargs='+', metavar='number')
+
+    find_parser = commands.add_parser('find', help='search tasks')
+    find_parser.add_argument('-c', '--category')
+    find_parser.add_argument('-p', '--priority', choices=PRIORITIES)
+    due = find_parser.add_mutually_exclusive_group()
+    due.add_argument('--overdue', action='store_true', help='open tasks past their deadline')
+    due.add_argument('--due-within', type=int, metavar='DAYS',
+                     help='open tasks due from today to DAYS days from today')
+    find_parser.add_argument('-t', '--text', help='text contains this, ignoring case')
+    find_parser.add_argument('-s', '--sort', choices=[prefix + key for key in SORT_KEYS for prefix in ('', '-')],
+                             metavar='KEY', help=f'sort by {", ".join(SORT_KEYS)}; prefix with - to reverse')
+    find_parser.add_argument('-n', '--limit', type=int, help='show at most this many tasks')
+    find_parser.add_argument('--stream', action='store_true', help='filter tasks while reading them from storage')
+    status = find_parser.add_mutually_exclusive_group()
+    status.add_argument('--done', dest='done', action='store_true', default=None)
+    status.add_argument('--not-done', dest='done', action='store_false')
+
+    search_parser = commands.add_parser('search', help='find tasks by words in their text or category')
+    search_parser.add_argument('words', nargs='+', help='each word matches a whole word or its start')
+    search_parser.add_argument('-n', '--limit', type=int, help='show at most this many tasks')
+
+    stats_parser = commands.add_parser('stats', help='show task counts per category, priority and deadline')
+    stats_parser.add_argument('--json', action='store_true', help='print the summary as JSON')
+
+    remind_parser = commands.add_parser('remind', help='show overdue tasks, then announce new ones until stopped')
+    remind_parser.add_argument('--reload', type=int, default=60, metavar='SECONDS',
+                               help='how often to pick up changes made by other processes')
+
+    daemon_parser = commands.add_parser('daemon', help='keep the tasks in memory and serve other runs over a socket')
+    daemon_parser.add_argument('--commit-delay', type=float, metavar='MS',
+                               help='how long a write waits for others to be saved with it (default 2)')
+
+    import_parser = commands.add_parser('import', help='add tasks from a CSV or NDJSON file')
+    import_parser.add_argument('file')
+    import_parser.add_argument('--format', choices=('csv', 'ndjson'))
+
+    export_parser = commands.add_parser('export', help='write all tasks to a CSV or NDJSON file')
+    export_parser.add_argument('file')
+    export_parser.add_argument('--format', choices=('csv', 'ndjson'))
+
+    return parser
+
+
+def task_ids(manager, numbers):
+    unknown = manager.unknown_ids(numbers)
+    if unknown:
+        raise ValueError(f'No task with number {unknown[0]}')
+    return numbers
+
+
+def command_add(manager, args):
+    task = manager.create_task(args.text, args.category, args.priority, args.days)
+    print(f'Task "{task.text}" added!')
+
+
+def command_list(manager, args):
+    from utils import StreamPager, render_table
+    if args.page is not None:
+        if args.page < 1 or args.page_size < 1:
+            raise ValueError('Page number and page size must be positive')
+        start = (args.page - 1) * args.page_size
+        if args.stream:
+            rows = StreamPager(manager.storage).page(start, args.page_size)
+        else:
+            rows = manager.tasks[start:start + args.page_size]
+        title = f'Tasks list (page {args.page})'
+    else:
+        rows = list(manager.storage.iter_tasks() if args.stream else manager.tasks)
+        title = 'Tasks list'
+
+    if not rows:
+        print('Error: Task list is empty.')
+        return
+    render_table(title, rows)
+
+
+def command_complete(manager, args):
+    completed = manager.complete_tasks(task_ids(manager, args.numbers))
+    print(f'{len(completed)} task(s) completed!')
+
+
+def command_delete(manager, args):
+    removed = manager.remove_tasks(task_ids(manager, args.numbers))
+    print(f'{len(removed)} task(s) deleted!')
+
+
+def command_find(manager, args):
+    from datetime import date
+    from storage import iter_matches
+    from ordering import order_tasks
+    from utils import render_table
+    # like the menu, deadline searches show open tasks unless --done is given,
+    # and tasks due soon do not include the overdue ones
+    today = date.today().toordinal()
+    due_before = due_from = None
+    done = args.done
+    if args.overdue:
+        due_before = today
+    elif args.due_within is not None:
+        due_from, due_before = today, today + args.due_within + 1
+    if done is None and due_before is not None:
+        done = False
+    criteria = dict(category=args.category, priority=args.priority, done=done, due_before=due_before,
+                    due_from=due_from, text_contains=args.text)
+    if args.limit is not None and args.limit < 1:
+        raise ValueError('Limit must be positive')
+    if args.stream:
+        tasks = manager.storage.iter_tasks(category=args.category)
+        matches = list(order_tasks(iter_matches(tasks, **criteria), args.sort, args.limit))
+    else:
+        matches = list(manager.query(sort=args.sort, limit=args.limit, **criteria))
+    if not matches:
+        print('Error: No matching tasks found.')
+        return
+    render_table('Search results', matches)
+
+
+def command_search(manager, args):
+    from utils import render_table
+    if args.limit is not None and args.limit < 1:
+        raise ValueError('Limit must be positive')
+    matches = manager.search(' '.join(args.words), args.limit)
+    if not matches:
+        print('Error: No matching tasks found.')
+        return
+    render_table('Search results', matches)
+
+
+def command_stats(manager, args):
+    from utils import render_statistics
+    summary = manager.statistics()
+    if args.json:
+        import json
+        print(json.dumps(summary, indent=4, ensure_ascii=False))
+    else:
+        render_statistics(summary)
+
+
+def command_remind(manager, args):
+    from utils import render_table
+    overdue = manager.overdue_tasks()
+    if overdue:
+        render_table('List of overdue tasks', overdue)
+    manager.start_reminders()
+    print('\nWaiting for deadlines, press Ctrl+C to stop...')
+    try:
+        while True:
+            time.sleep(args.reload)
+            # only rereads the file when another process changed it
+            manager.load_data()
+    except KeyboardInterrupt:
+        print('\nGoodbye!')
+
+
+def command_import(manager, args):
+    from storage import read_tasks_file
+    count = manager.import_tasks(read_tasks_file(args.file, args.format))
+    print(f'{count} task(s) imported!')
+
+
+def command_export(manager, args):
+    from storage import write_tasks_file
+    count = write_tasks_file(args.file, manager.tasks, args.format)
+    print(f'{count} task(s) exported to {args.file}')
+
+
+COMMANDS = {
+    'add': command_add,
+    'list': command_list,
+    'complete': command_complete,
+    'delete': command_delete,
+    'find': command_find,
+    'search': command_search,
+    'stats': command_stats,
+    'remind': command_remind,
+    'import': command_import,
+    'export': command_export,
+}
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # passed on like the other settings, so storage, the daemon and its
+    # clients all agree on which list they work on
+    if args.root:
+        os.environ['TODO_ROOT'] = args.root
+    if args.list:
+        os.environ['TODO_LIST'] = args.list
+    from logconfig import setup_logging
+    import instrumentation
+    import logging
+    setup_logging(args.log_level)
+    if args.instrument or args.profile or os.environ.get('TODO_INSTRUMENT') == '1':
+        instrumentation.enable(args.profile)
+    if args.command is None:
+        # the menu builds its own TaskManager
+        from cli import menu
+        menu(args.remind, args.daemon)
+        return 0
+    if args.command == 'daemon':
+        from daemon import COMMIT_DELAY, run_daemon
+        try:
+            run_daemon(commit_delay=COMMIT_DELAY if args.commit_delay is None else args.commit_delay)
+            return 0
+        except (ValueError, OSError) as e:
+            print(f'Error: {e}')
+            logging.error('Daemon failed: %s', e)
+            return 1
+
+    manager = None
+    try:
+        # Streaming reads the file itself, and remind needs reminders in this process.
+        if args.daemon and not getattr(args, 'stream', False) and args.command != 'remind':
+            from client import connect
+            manager = connect()
+        if manager is None:
+            from utils import TaskManager
+            manager = TaskManager()
+    except (ValueError, OSError) as e:
+        print(f'Error: {e}')
+        logging.error('Cannot open the task list: %s', e)
+        return 1
+
+    # on storage split by category, a category search reads just that shard
+    if args.command == 'find' and args.category is not None and getattr(manager.storage, 'partitioned', False):
+        args.stream = True
+    try:
+        # --stream reads the file itself, and stats can answer from saved counters
+        with instrumentation.profiled(args.command):
+            if not getattr(args, 'stream', False) and args.command != 'stats':
+                manager.load_data()
+            COMMANDS[args.command](manager, args)
+        return 0
+
+    except (ValueError, KeyError, OSError) as e:
+        print(f'Error: {e}')
+        logging.error('Command %s failed: %s', args.command, e)
+        return 1
+
+    finally:
+        manager.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
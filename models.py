@@ -1,22 +1,76 @@
-from datetime import datetime
-
-
-class Task:
-    def __init__(self, text, category, priority, deadline):
-        self.text = text
-        self.category = category
-        self.priority = priority
-        self.done = False
-        self.date = datetime.today().date().strftime('%d-%m-%Y')
-        self.deadline = deadline.strftime('%d-%m-%Y')
-
-
-    def to_dict(self):
-        return {
-            'text': self.text,
-            'category': self.category,
-            'priority': self.priority,
-            'date': self.date,
-            'done': self.done,
-            'deadline': self.deadline
-        }
\ No newline at end of file
+from datetime import date, datetime
+from functools import lru_cache
+
+
+DATE_FORMAT = '%d-%m-%Y'
+
+
+# Task lists share a few thousand distinct dates at most, so memoizing the
+# strptime call turns rebuilding indexes on large lists into dict lookups.
+@lru_cache(maxsize=4096)
+def parse_date(value: str):
+    try:
+        return datetime.strptime(value, DATE_FORMAT).toordinal()
+    except (ValueError, TypeError):
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _format_ordinal(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime(DATE_FORMAT)
+
+
+def format_date(value) -> str:
+    # Dates are kept as ordinals; a value that could not be parsed when loading
+    # is kept as the original string so it is written back unchanged.
+    if isinstance(value, int):
+        return _format_ordinal(value)
+    return value
+
+
+def to_ordinal(value):
+    if isinstance(value, (date, datetime)):
+        return value.toordinal()
+    if isinstance(value, str):
+        ordinal = parse_date(value)
+        return value if ordinal is None else ordinal
+    return value
+
+
+class Task:
+    __slots__ = ('id', 'text', 'category', 'priority', 'done', 'date', 'deadline')
+
+    def __init__(self, text, category, priority, deadline, done=False, date=None, id=None):
+        # id is assigned by TaskManager when the task is added and never changes
+        self.id = id
+        self.text = text
+        self.category = category
+        self.priority = priority
+        self.done = done
+        self.date = to_ordinal(date) if date is not None else datetime.today().toordinal()
+        self.deadline = to_ordinal(deadline)
+
+
+    @classmethod
+    def from_dict(cls, data, default_id=None):
+        # Files written before tasks had ids get their position as id, which
+        # stays stable until the next full save writes the ids out.
+        return cls(data['text'], data['category'], data['priority'], data['deadline'],
+                   done=data['done'], date=data['date'], id=data.get('id', default_id))
+
+
+    def same_as(self, other):
+        return (self.text, self.category, self.priority, self.date, self.deadline) == \
+               (other.text, other.category, other.priority, other.date, other.deadline)
+
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'text': self.text,
+            'category': self.category,
+            'priority': self.priority,
+            'date': format_date(self.date),
+            'done': self.done,
+            'deadline': format_date(self.deadline)
+        }
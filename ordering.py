@@ -0,0 +1,41 @@
+from itertools import islice
+import heapq
+
+
+PRIORITY_RANK = {'High': 0, 'Medium': 1, 'Low': 2}
+
+
+def _date_key(value):
+    # dates that could not be parsed sort after all real ones
+    return (0, value) if isinstance(value, int) else (1, 0)
+
+
+# Every key ends with the id, so ties keep list order and results are stable.
+SORT_KEYS = {
+    'id': lambda task: task.id,
+    'deadline': lambda task: (_date_key(task.deadline), task.id),
+    'date': lambda task: (_date_key(task.date), task.id),
+    'priority': lambda task: (PRIORITY_RANK.get(task.priority, len(PRIORITY_RANK)), task.id),
+    'category': lambda task: (task.category.lower(), task.id),
+    'text': lambda task: (task.text.lower(), task.id),
+}
+
+
+def sort_key(sort):
+    # 'deadline' sorts ascending, '-deadline' descending
+    name = sort[1:] if sort.startswith('-') else sort
+    if name not in SORT_KEYS:
+        raise ValueError(f'Unknown sort key: {name}')
+    return SORT_KEYS[name], sort.startswith('-')
+
+
+def order_tasks(tasks, sort=None, limit=None):
+    # With a limit, a heap keeps only the best `limit` tasks in memory, so the
+    # top of a large stream costs O(n log limit) instead of a full sort.
+    if sort is None:
+        return islice(tasks, limit)
+    key, reverse = sort_key(sort)
+    if limit is not None:
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return iter(select(limit, tasks, key=key))
+    return iter(sorted(tasks, key=key, reverse=reverse))
@@ -0,0 +1,162 @@
+from datetime import date, datetime, time
+import threading
+import logging
+import heapq
+
+
+# The reminder thread also wakes this often, so a changed clock or a
+# suspended machine cannot leave it asleep past a deadline for long.
+RECHECK_SECONDS = 3600
+
+
+class DeadlineScheduler:
+    # Open tasks with a deadline, split into a min-heap of (deadline, id) for
+    # those still upcoming and a map of those already overdue. Tasks leave the
+    # heap lazily: discarding one only drops it from `live`, and its heap entry
+    # is skipped when it reaches the head or the heap is compacted.
+    def __init__(self):
+        self.heap = []
+        self.live = {}
+        self.overdue = {}
+        self.today = date.today().toordinal()
+        self.on_overdue = None
+        self.changed = threading.Condition()
+
+
+    def rebuild(self, tasks):
+        with self.changed:
+            self.live.clear()
+            self.overdue.clear()
+            for task in tasks:
+                self._place(task)
+            self.heap = [(deadline, task_id) for task_id, deadline in self.live.items()]
+            heapq.heapify(self.heap)
+            self.changed.notify_all()
+
+
+    def _place(self, task):
+        # Tasks that were already overdue when they arrived are not announced.
+        if task.done or not isinstance(task.deadline, int):
+            return False
+        if task.deadline < self.today:
+            self.overdue[task.id] = task.deadline
+            return False
+        self.live[task.id] = task.deadline
+        return True
+
+
+    def add(self, task):
+        with self.changed:
+            if self._place(task):
+                heapq.heappush(self.heap, (task.deadline, task.id))
+                if self.heap[0] == (task.deadline, task.id):
+                    # the reminder thread may be waiting for a later deadline
+                    self.changed.notify_all()
+
+
+    def extend(self, tasks):
+        for task in tasks:
+            self.add(task)
+
+
+    def discard(self, task):
+        with self.changed:
+            self.overdue.pop(task.id, None)
+            if self.live.pop(task.id, None) is not None and len(self.heap) > 2 * len(self.live) + 64:
+                self.heap = [(deadline, task_id) for task_id, deadline in self.live.items()]
+                heapq.heapify(self.heap)
+
+
+    def _head(self):
+        # drops discarded entries until the head is a live task
+        while self.heap and self.live.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+
+    def advance(self, today=None):
+        # Moves tasks whose deadline has passed from the heap to overdue and
+        # returns their ids. Only the head of the heap is looked at.
+        crossed = []
+        with self.changed:
+            self.today = max(self.today, today or date.today().toordinal())
+            head = self._head()
+            while head is not None and head[0] < self.today:
+                deadline, task_id = heapq.heappop(self.heap)
+                del self.live[task_id]
+                self.overdue[task_id] = deadline
+                crossed.append(task_id)
+                head = self._head()
+        if crossed and self.on_overdue is not None:
+            self.on_overdue(crossed)
+        return crossed
+
+
+    def overdue_ids(self, today=None):
+        self.advance(today)
+        with self.changed:
+            return [task_id for _, task_id in sorted((deadline, task_id)
+                                                     for task_id, deadline in self.overdue.items())]
+
+
+    def due_within(self, days, today=None):
+        # Ids of open tasks due from today up to today + days. The heap is
+        # walked as a tree and a subtree is skipped as soon as its root is
+        # due later, so only the matching entries and their children are read.
+        self.advance(today)
+        end = self.today + days
+        found = {}
+        with self.changed:
+            stack = [0] if self.heap else []
+            while stack:
+                position = stack.pop()
+                deadline, task_id = self.heap[position]
+                if deadline > end:
+                    continue
+                if self.live.get(task_id) == deadline:
+                    found[task_id] = deadline
+                stack.extend(child for child in (2 * position + 1, 2 * position + 2) if child < len(self.heap))
+        return sorted(found, key=lambda task_id: (found[task_id], task_id))
+
+
+    def seconds_to_next(self):
+        # A task becomes overdue at the midnight that ends its deadline day.
+        with self.changed:
+            head = self._head()
+        if head is None:
+            return None
+        crossing = datetime.combine(date.fromordinal(head[0] + 1), time.min)
+        return max((crossing - datetime.now()).total_seconds(), 0)
+
+
+
+
+class Reminder(threading.Thread):
+    # Sleeps until the earliest upcoming deadline has passed, or until a task
+    # with an earlier one is added, then lets the scheduler announce the
+    # tasks that became overdue. The task list itself is never scanned.
+    def __init__(self, scheduler):
+        super().__init__(name='reminders', daemon=True)
+        self.scheduler = scheduler
+        self.stopped = False
+
+
+    def run(self):
+        logging.info("Reminders started")
+        while True:
+            with self.scheduler.changed:
+                if self.stopped:
+                    break
+                timeout = self.scheduler.seconds_to_next()
+                self.scheduler.changed.wait(RECHECK_SECONDS if timeout is None else min(timeout, RECHECK_SECONDS))
+                if self.stopped:
+                    break
+            self.scheduler.advance()
+        logging.info("Reminders stopped")
+
+
+    def stop(self):
+        with self.scheduler.changed:
+            self.stopped = True
+            self.scheduler.changed.notify_all()
+        self.join()
@@ -0,0 +1,160 @@
+from bisect import bisect_left, insort
+from collections import Counter
+from storage import load_sidecar, save_sidecar
+import logging
+import heapq
+import math
+import re
+
+
+INDEX_VERSION = 1
+
+# Prefix matches rank below whole-word matches of the same term.
+PREFIX_WEIGHT = 0.5
+
+_WORDS = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list:
+    return _WORDS.findall(text.lower())
+
+
+def task_tokens(task) -> Counter:
+    return Counter(tokenize(task.text) + tokenize(task.category))
+
+
+class SearchIndex:
+    # Inverted index from lowercase words of a task's text and category to
+    # {task id: occurrences}. The vocabulary is also kept sorted, so a prefix
+    # is a bisect into it instead of a scan over every word.
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []
+        self.size = 0
+        self.stamp = None
+        self.last_scanned = 0
+
+
+    def rebuild(self, tasks):
+        self.__init__()
+        for task in tasks:
+            self._insert(task)
+        self.vocabulary = sorted(self.postings)
+        logging.debug("Built search index for %s tasks, %s words", self.size, len(self.vocabulary))
+
+
+    def _insert(self, task):
+        self.size += 1
+        for token, occurrences in task_tokens(task).items():
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = {}
+            ids[task.id] = occurrences
+
+
+    def add(self, task):
+        for token in task_tokens(task):
+            if token not in self.postings:
+                insort(self.vocabulary, token)
+        self._insert(task)
+
+
+    def extend(self, tasks):
+        for task in tasks:
+            self._insert(task)
+        self.vocabulary = sorted(self.postings)
+
+
+    def remove(self, task):
+        # the text never changes, so tokenizing it again finds every posting
+        self.size -= 1
+        for token in task_tokens(task):
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.pop(task.id, None)
+            if not ids:
+                del self.postings[token]
+                position = bisect_left(self.vocabulary, token)
+                if position < len(self.vocabulary) and self.vocabulary[position] == token:
+                    self.vocabulary.pop(position)
+
+
+    def _expand(self, term):
+        # words starting with term, the word itself first
+        position = bisect_left(self.vocabulary, term)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(term):
+            yield self.vocabulary[position]
+            position += 1
+
+
+    def _term_scores(self, term):
+        # tf-idf of the best matching word per task
+        scores = {}
+        for token in self._expand(term):
+            ids = self.postings[token]
+            self.last_scanned += len(ids)
+            weight = math.log(1 + self.size / len(ids)) * (1 if token == term else PREFIX_WEIGHT)
+            for task_id, occurrences in ids.items():
+                score = weight * (1 + math.log(occurrences))
+                if score > scores.get(task_id, 0):
+                    scores[task_id] = score
+        return scores
+
+
+    def search(self, query, limit=None, rank=None):
+        # Every term has to match a word or the start of one. Returns
+        # (score, task id) pairs, best first; rank(task_id) breaks ties.
+        terms = list(dict.fromkeys(tokenize(query)))
+        self.last_scanned = 0
+        if not terms:
+            return []
+
+        # start from the rarest term, so the candidate set only shrinks
+        term_scores = sorted(map(self._term_scores, terms), key=len)
+        scores = term_scores[0]
+        for other in term_scores[1:]:
+            scores = {task_id: score + other[task_id] for task_id, score in scores.items() if task_id in other}
+            if not scores:
+                return []
+
+        def key(item):
+            return (-item[1], rank(item[0]) if rank else 0, item[0])
+
+        if limit is not None:
+            best = heapq.nsmallest(limit, scores.items(), key=key)
+        else:
+            best = sorted(scores.items(), key=key)
+        return [(score, task_id) for task_id, score in best]
+
+
+    def save(self, path, stamp):
+        # stamp identifies the task data the index was built from. Most words
+        # occur once in a task, so only the other counts are written out.
+        postings = {token: list(ids) for token, ids in self.postings.items()}
+        repeats = {}
+        for token, ids in self.postings.items():
+            counts = [value for task_id, occurrences in ids.items() if occurrences > 1
+                      for value in (task_id, occurrences)]
+            if counts:
+                repeats[token] = counts
+        if save_sidecar(path, INDEX_VERSION, stamp, {'size': self.size, 'postings': postings, 'repeats': repeats}):
+            self.stamp = stamp
+
+
+    def load(self, path, stamp):
+        # Returns False, leaving the index empty, unless the file was built
+        # from exactly this task data.
+        data = load_sidecar(path, INDEX_VERSION, stamp)
+        if data is None:
+            return False
+
+        self.__init__()
+        self.size = data['size']
+        for token, ids in data['postings'].items():
+            self.postings[token] = dict.fromkeys(ids, 1)
+        for token, counts in data['repeats'].items():
+            self.postings[token].update(zip(counts[::2], counts[1::2]))
+        self.vocabulary = sorted(self.postings)
+        self.stamp = stamp
+        return True
@@ -0,0 +1,135 @@
+from collections import Counter
+from datetime import date
+from ordering import PRIORITY_RANK
+from storage import load_sidecar, save_sidecar
+import logging
+
+
+STATS_VERSION = 1
+
+# Buckets of open tasks by deadline, in display order.
+DEADLINE_BUCKETS = ('overdue', 'today', 'week', 'later', 'undated')
+
+
+class TaskStats:
+    # Counters over the task list, kept up to date in O(1) by every add,
+    # completion and delete. Open tasks are counted per category and deadline
+    # day rather than per bucket, because which bucket a day falls in moves
+    # with the date; a summary adds the days up, so it costs as much as there
+    # are distinct deadlines, not tasks.
+    def __init__(self):
+        self.total = 0
+        self.done = 0
+        # lowercase category -> [name as first written, total, done]
+        self.categories = {}
+        # priority -> [total, done]
+        self.priorities = {}
+        # (lowercase category, deadline or None when unparsed) -> open tasks
+        self.open_deadlines = Counter()
+        self.stamp = None
+
+
+    def rebuild(self, tasks):
+        self.__init__()
+        for task in tasks:
+            self.add(task)
+        logging.debug("Counted statistics for %s tasks", self.total)
+
+
+    def add(self, task):
+        self._count(task, 1)
+
+
+    def remove(self, task):
+        self._count(task, -1)
+
+
+    def complete(self, task):
+        # called while task.done is still False
+        key = task.category.lower()
+        self.done += 1
+        self.categories[key][2] += 1
+        self.priorities[task.priority][1] += 1
+        self._count_open(key, task.deadline, -1)
+
+
+    def _count(self, task, step):
+        key = task.category.lower()
+        category = self.categories.setdefault(key, [task.category, 0, 0])
+        priority = self.priorities.setdefault(task.priority, [0, 0])
+        self.total += step
+        category[1] += step
+        priority[0] += step
+        if task.done:
+            self.done += step
+            category[2] += step
+            priority[1] += step
+        else:
+            self._count_open(key, task.deadline, step)
+        if not category[1]:
+            del self.categories[key]
+        if not priority[0]:
+            del self.priorities[task.priority]
+
+
+    def _count_open(self, key, deadline, step):
+        day = (key, deadline if isinstance(deadline, int) else None)
+        self.open_deadlines[day] += step
+        if not self.open_deadlines[day]:
+            del self.open_deadlines[day]
+
+
+    def summary(self, today=None):
+        today = today or date.today().toordinal()
+        deadlines = dict.fromkeys(DEADLINE_BUCKETS, 0)
+        overdue = Counter()
+        for (key, deadline), count in self.open_deadlines.items():
+            if deadline is None:
+                bucket = 'undated'
+            elif deadline < today:
+                bucket = 'overdue'
+                overdue[key] += count
+            elif deadline == today:
+                bucket = 'today'
+            elif deadline <= today + 7:
+                bucket = 'week'
+            else:
+                bucket = 'later'
+            deadlines[bucket] += count
+
+        categories = sorted(self.categories.items(), key=lambda item: (-item[1][1], item[0]))
+        priorities = sorted(self.priorities.items(),
+                            key=lambda item: (PRIORITY_RANK.get(item[0], len(PRIORITY_RANK)), item[0]))
+        return {
+            'total': self.total,
+            'done': self.done,
+            'categories': [{'name': name, 'total': total, 'done': done, 'overdue': overdue[key]}
+                           for key, (name, total, done) in categories],
+            'priorities': [{'name': name, 'total': total, 'done': done} for name, (total, done) in priorities],
+            'deadlines': deadlines,
+        }
+
+
+    def save(self, path, stamp):
+        # stamp identifies the task data the counters were taken from
+        data = {'total': self.total, 'done': self.done, 'categories': self.categories, 'priorities': self.priorities,
+                'open_deadlines': [[key, deadline, count] for (key, deadline), count in self.open_deadlines.items()]}
+        if save_sidecar(path, STATS_VERSION, stamp, data):
+            self.stamp = stamp
+
+
+    def load(self, path, stamp):
+        # Returns False, leaving the counters empty, unless the file was
+        # written for exactly this task data.
+        data = load_sidecar(path, STATS_VERSION, stamp)
+        if data is None:
+            return False
+
+        self.__init__()
+        self.total = data['total']
+        self.done = data['done']
+        self.categories = data['categories']
+        self.priorities = data['priorities']
+        self.open_deadlines = Counter({(key, deadline): count for key, deadline, count in data['open_deadlines']})
+        self.stamp = stamp
+        return True
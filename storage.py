@@ -0,0 +1,944 @@
+from models import Task, format_date, parse_date
+from jsoncodec import get_codec
+from locking import FileLock
+from pathlib import Path
+from itertools import count, islice
+from ordering import PRIORITY_RANK, order_tasks
+from urllib.parse import quote
+import threading
+import logging
+import heapq
+import json
+import os
+import re
+
+
+COMPACT_THRESHOLD = 1000
+# Characters of the quoted category kept in a shard's file name.
+SHARD_NAME_LIMIT = 64
+
+
+def stat_signature(path: Path):
+    # mtime alone is not enough: a rewrite within the same timestamp tick or a
+    # replace by rename can keep it unchanged, so size and inode are compared too.
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def apply_record(tasks: dict, record: dict) -> None:
+    # tasks maps id to task in list order; journals written before tasks had
+    # ids address them by position instead
+    op = record['op']
+    if op == 'add':
+        task = Task.from_dict(record['task'], len(tasks) + 1)
+        tasks[task.id] = task
+    elif op in ('complete', 'delete'):
+        task_id = record['id'] if 'id' in record else list(tasks)[record['index']]
+        if op == 'complete':
+            tasks[task_id].done = True
+        else:
+            del tasks[task_id]
+    elif op != 'base':
+        raise ValueError(f'Unknown journal operation: {op}')
+
+
+def write_atomic(path: Path, chunks) -> int:
+    # Readers either see the old file or the new one, never a half-written one.
+    # Sidecars are written without the file lock, so the temporary file is
+    # unique to the process.
+    tmp_path = path.with_name(f'{path.name}.tmp.{os.getpid()}')
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.writelines(chunks)
+            size = f.tell()
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return size
+
+
+def save_sidecar(path: Path, version, stamp, data: dict) -> bool:
+    # Files derived from the task data, such as the search index and the
+    # statistics, carry their format version and the stamp of the task data
+    # they were built from.
+    try:
+        write_atomic(path, [get_codec().encode({'version': version, 'stamp': stamp, **data})])
+    except OSError as e:
+        logging.error("Failed to write %s: %s", path.name, e)
+        return False
+    logging.debug("Saved %s", path.name)
+    return True
+
+
+def load_sidecar(path: Path, version, stamp):
+    # None when the file is missing or unreadable, or was written by another
+    # version or for other task data; a None stamp matches nothing.
+    if stamp is None:
+        return None
+    try:
+        data = get_codec().decode(path.read_bytes())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get('version') != version or data.get('stamp') != stamp:
+        return None
+    logging.debug("Loaded %s", path.name)
+    return data
+
+
+def repair_tail(path: Path, decode=json.loads) -> int:
+    # A crash in the middle of an append can leave a partial last line, and the
+    # next append would be glued onto it. Called under the exclusive lock before
+    # appending: a last line that does not decode is cut off, one that does
+    # only gets its missing newline. Returns the number of bytes dropped.
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        return 0
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        if not size:
+            return 0
+        end = size
+        while end:
+            start = max(0, end - (1 << 16))
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end == size:
+            return 0
+        f.seek(end)
+        try:
+            decode(f.read())
+        except ValueError:
+            f.truncate(end)
+            logging.warning("Cut a torn record of %s bytes off the end of %s", size - end, path.name)
+            return size - end
+        f.write(b'\n')
+        return 0
+
+
+_ARRAY_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_file(path, decode=json.loads, chunk_size=1 << 16):
+    # Yields one dict per task from either an NDJSON file or a JSON array, so
+    # only a chunk of text and the current task are held in memory at once.
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        if not buffer.lstrip().startswith('['):
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    try:
+                        data = decode(line)
+                    except ValueError:
+                        # only a last line cut short by a crash is forgiven
+                        if line.endswith('\n'):
+                            raise
+                        logging.warning("Ignoring torn record at the end of %s", Path(path).name)
+                        return
+                    yield data
+            return
+
+        decoder = json.JSONDecoder()
+        position = buffer.index('[') + 1
+        while True:
+            position = _ARRAY_SEPARATORS.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                data, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The next task is cut off by the end of the chunk: read more.
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buffer = buffer[position:] + more
+                position = 0
+                continue
+            yield data
+
+
+def write_ndjson(f, tasks, codec):
+    written = 0
+    for task in tasks:
+        f.write(codec.encode(task.to_dict()) + b'\n')
+        written += 1
+    return written
+
+
+def iter_matches(tasks, category=None, priority=None, done=None, due_before=None, text_contains=None,
+                 due_from=None):
+    # due_before is exclusive and due_from inclusive, both date ordinals
+    category_key = category.lower() if category is not None else None
+    text_key = text_contains.lower() if text_contains else None
+    for task in tasks:
+        if category_key is not None and task.category.lower() != category_key:
+            continue
+        if priority is not None and task.priority != priority:
+            continue
+        if done is not None and task.done != done:
+            continue
+        if due_before is not None or due_from is not None:
+            if not isinstance(task.deadline, int):
+                logging.error('Invalid deadline format in task "%s"', task.text)
+                continue
+            if due_before is not None and task.deadline >= due_before:
+                continue
+            if due_from is not None and task.deadline < due_from:
+                continue
+        if text_key is not None and text_key not in task.text.lower():
+            continue
+        yield task
+
+
+class JsonStorage:
+    name = 'json'
+    pushdown = False
+    partitioned = False
+
+    def __init__(self, path='tasks.json', codec=None):
+        self.path = Path(path)
+        self.codec = codec or get_codec()
+        self.lock = FileLock(self.path.with_name(self.path.name + '.lock'))
+        # Totals of the file bytes read and written, used by instrumentation.
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.last_scanned = 0
+
+
+    def exists(self):
+        return self.path.exists()
+
+
+    def signature(self):
+        return stat_signature(self.path)
+
+
+    def generation(self):
+        # Bumped by every write from any process, so a writer can tell whether
+        # the tasks it loaded are still the latest.
+        with self.lock.shared():
+            return self.lock.read_state()[0]
+
+
+    def last_id(self):
+        # Highest task id any process has handed out, so the id of a deleted
+        # task is never given to a new one.
+        with self.lock.shared():
+            return self.lock.read_state()[1]
+
+
+    def bump_generation(self, last_id=0):
+        with self.lock.exclusive():
+            generation, known = self.lock.read_state()
+            self.lock.write_state(generation + 1, max(known, last_id))
+            return generation + 1
+
+
+    def load(self):
+        self.bytes_read += self.path.stat().st_size
+        return list(map(Task.from_dict, iter_json_file(self.path, self.codec.decode), count(1)))
+
+
+    def iter_tasks(self, start=0, category=None):
+        # category is a hint: backends split by category only read that part,
+        # the others yield everything and leave the filtering to the caller
+        if not self.exists():
+            return iter(())
+        self.bytes_read += self.path.stat().st_size
+        return islice(map(Task.from_dict, iter_json_file(self.path, self.codec.decode), count(1)), start, None)
+
+
+    def save(self, tasks):
+        self.bytes_written += write_atomic(self.path, self.codec.encode_array(task.to_dict() for task in tasks))
+        logging.info("Saved %s tasks to %s", len(tasks), self.path.name)
+
+
+    def record(self, op, tasks, task):
+        self.record_many(tasks, [(op, task)])
+
+
+    def record_many(self, tasks, records):
+        # records are (op, task) pairs already applied to tasks, in order
+        if records:
+            self.save(tasks)
+
+
+    def query(self, tasks, category=None, priority=None, done=None, due_before=None, text_contains=None,
+              sort=None, limit=None, due_from=None):
+        # tasks maps id to task
+        self.last_scanned = len(tasks)
+        matches = iter_matches(tasks.values(), category=category, priority=priority, done=done,
+                               due_before=due_before, text_contains=text_contains, due_from=due_from)
+        return list(order_tasks(matches, sort, limit))
+
+
+    def close(self):
+        pass
+
+
+
+
+class NdjsonStorage(JsonStorage):
+    # Same file as the json backend, one task per line. Either layout is read,
+    # so switching between the two backends needs no migration.
+    name = 'ndjson'
+
+    def save(self, tasks):
+        lines = (self.codec.encode(task.to_dict()) + b'\n' for task in tasks)
+        self.bytes_written += write_atomic(self.path, lines)
+        logging.info("Saved %s tasks to %s", len(tasks), self.path.name)
+
+
+    def record_many(self, tasks, records):
+        if not records:
+            return
+        if all(op == 'add' for op, _ in records) and self._is_ndjson():
+            repair_tail(self.path, self.codec.decode)
+            with open(self.path, 'ab') as f:
+                start = f.tell()
+                write_ndjson(f, (task for _, task in records), self.codec)
+                self.bytes_written += f.tell() - start
+            logging.debug("Appended %s tasks to %s", len(records), self.path.name)
+        else:
+            self.save(tasks)
+
+
+    def _is_ndjson(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return not f.read(64).lstrip().startswith('[')
+        except FileNotFoundError:
+            return False
+
+
+
+
+class JournalStorage(JsonStorage):
+    name = 'journal'
+
+    def __init__(self, path='tasks.json', codec=None, threshold=COMPACT_THRESHOLD):
+        super().__init__(path, codec)
+        self.journal_path = self.path.with_name(self.path.name + '.journal')
+        self.pending_path = self.path.with_name(self.path.name + '.journal.old')
+        # written outside the file lock, so every process needs its own
+        self.compact_path = self.path.with_name(f'{self.path.name}.compact.{os.getpid()}')
+        self.threshold = threshold
+        self.records = 0
+        self._lock = threading.Lock()
+        self._compaction = None
+        self._compaction_base = None
+        self._compacted = False
+
+
+    def exists(self):
+        return self.path.exists() or self.journal_path.exists() or self.pending_path.exists()
+
+
+    def signature(self):
+        # Every writer that replaces the snapshot also rotates or truncates the
+        # journal, so once a journal exists its stat alone tells whether anything
+        # changed. Our own background compaction only touches the snapshot and
+        # therefore does not invalidate the cache.
+        return stat_signature(self.journal_path) or stat_signature(self.path)
+
+
+    def load(self):
+        self.wait()
+        tasks = {task.id: task for task in (super().load() if self.path.exists() else [])}
+
+        if self.pending_path.exists():
+            records = self._read(self.pending_path)
+            base = records[-1]['snapshot'] if records and records[-1]['op'] == 'base' else None
+            snapshot = stat_signature(self.path)
+            if base == (list(snapshot) if snapshot else None):
+                # A compaction is still running, possibly in another process,
+                # or one was interrupted; either way the records still count.
+                for record in records:
+                    apply_record(tasks, record)
+            else:
+                # The snapshot was replaced after the rotation, so the compaction
+                # finished and was only interrupted before removing the old journal.
+                self.pending_path.unlink(missing_ok=True)
+
+        records = self._read(self.journal_path)
+        for record in records:
+            apply_record(tasks, record)
+        self.records = len(records)
+        logging.debug("Replayed %s records from %s", len(records), self.journal_path.name)
+        return list(tasks.values())
+
+
+    def iter_tasks(self, start=0, category=None):
+        # A completion or deletion in the journal can refer to any task of the
+        # snapshot, so the list is rebuilt before anything is yielded.
+        if not self.exists():
+            return iter(())
+        return islice(self.load(), start, None)
+
+
+    def _read(self, path):
+        records = []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.bytes_read += os.fstat(f.fileno()).st_size
+                for line in f:
+                    try:
+                        records.append(self.codec.decode(line))
+                    except ValueError:
+                        # a torn record, which a later append may have been
+                        # glued onto before tails were repaired
+                        logging.warning("Skipping unreadable record in %s", path.name)
+        except FileNotFoundError:
+            pass
+        return records
+
+
+    def save(self, tasks):
+        self._finish_compaction()
+        with self._lock:
+            self.bytes_written += write_atomic(self.path, self.codec.encode_array(task.to_dict() for task in tasks))
+            open(self.journal_path, 'wb').close()
+            self.pending_path.unlink(missing_ok=True)
+            self.records = 0
+        logging.info("Saved %s tasks to %s", len(tasks), self.path.name)
+
+
+    def record_many(self, tasks, records):
+        if not records:
+            return
+        lines = []
+        for op, task in records:
+            entry = {'op': op, 'task': task.to_dict()} if op == 'add' else {'op': op, 'id': task.id}
+            lines.append(self.codec.encode(entry) + b'\n')
+
+        data = b''.join(lines)
+        with self._lock:
+            repair_tail(self.journal_path, self.codec.decode)
+            with open(self.journal_path, 'ab') as f:
+                f.write(data)
+            self.bytes_written += len(data)
+            self.records += len(lines)
+            logging.debug("Appended %s records to %s", len(lines), self.journal_path.name)
+
+        if self._compaction is not None and not self._compaction.is_alive():
+            self._finish_compaction()
+        if self.records >= self.threshold and self._compaction is None:
+            if self.pending_path.exists():
+                # Another process is compacting, or one died while doing so.
+                # A full save settles both: a live compaction sees the snapshot
+                # changed under it and throws its result away.
+                self.save(tasks)
+            else:
+                self._start_compaction(tasks)
+
+
+    def _start_compaction(self, tasks):
+        # The trailer names the snapshot these records apply to. If the snapshot on
+        # disk still matches it after a crash, the compaction never finished.
+        base = stat_signature(self.path)
+        trailer = self.codec.encode({'op': 'base', 'snapshot': base}) + b'\n'
+        with open(self.journal_path, 'ab') as f:
+            f.write(trailer)
+        self.bytes_written += len(trailer)
+        os.replace(self.journal_path, self.pending_path)
+        open(self.journal_path, 'wb').close()
+        self.records = 0
+
+        # Serialize in the foreground: 'complete' mutates tasks in place and must
+        # not leak into a snapshot whose journal no longer contains that record.
+        snapshot = [task.to_dict() for task in tasks]
+        self._compaction_base = base
+        self._compacted = False
+        self._compaction = threading.Thread(target=self._compact, args=(snapshot,), daemon=True)
+        self._compaction.start()
+
+
+    def _compact(self, snapshot):
+        # Runs in the background and only writes a side file. Installing it is
+        # left to _finish_compaction, which runs under the caller's file lock.
+        try:
+            with open(self.compact_path, 'wb') as f:
+                f.writelines(self.codec.encode_array(snapshot))
+                self.bytes_written += f.tell()
+            self._compacted = True
+
+        except OSError as e:
+            logging.error("Failed to compact %s: %s", self.journal_path.name, e)
+
+
+    def _finish_compaction(self):
+        # Installing the new snapshot and dropping the old journal must not
+        # interleave with another process reading them.
+        if self._compaction is None:
+            return
+        with self.lock.exclusive():
+            self.wait()
+            self._compaction = None
+            if not self._compacted:
+                self.compact_path.unlink(missing_ok=True)
+            elif stat_signature(self.path) == self._compaction_base and self.pending_path.exists():
+                os.replace(self.compact_path, self.path)
+                self.pending_path.unlink(missing_ok=True)
+                logging.info("Compacted %s into %s", self.journal_path.name, self.path.name)
+            else:
+                self.compact_path.unlink(missing_ok=True)
+                logging.info("Dropped compaction of %s, the snapshot changed meanwhile", self.journal_path.name)
+
+
+    def wait(self):
+        if self._compaction is not None:
+            self._compaction.join()
+
+
+    def close(self):
+        self._finish_compaction()
+
+
+
+
+class SqliteStorage(JsonStorage):
+    name = 'sqlite'
+    pushdown = True
+
+    def __init__(self, path='tasks.json'):
+        self.json_path = Path(path)
+        super().__init__(self.json_path.with_suffix('.db'))
+        # the list's lock, so its generation and last id carry over from json
+        self.lock = FileLock(self.json_path.with_name(self.json_path.name + '.lock'))
+        self.connection = None
+
+
+    def exists(self):
+        return self.path.exists() or self.json_path.exists()
+
+
+    def _connect(self):
+        if self.connection is None:
+            # imported here so the other backends never load the sqlite module
+            import sqlite3
+            created = not self.path.exists()
+            self.connection = sqlite3.connect(self.path)
+            self.connection.executescript('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    priority TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    deadline TEXT NOT NULL,
+                    category_key TEXT NOT NULL,
+                    deadline_ord INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_category ON tasks (category_key, priority, done);
+                DROP INDEX IF EXISTS idx_tasks_priority;
+                CREATE INDEX IF NOT EXISTS idx_tasks_priority_deadline ON tasks (priority, done, deadline_ord);
+                CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks (deadline_ord);
+                CREATE INDEX IF NOT EXISTS idx_tasks_done ON tasks (done, deadline_ord);
+            ''')
+            if created and self.json_path.exists():
+                migrate_json_to_sqlite(self.json_path, self.connection)
+        return self.connection
+
+
+    @staticmethod
+    def _task_from_row(row):
+        task_id, text, category, priority, date, done, deadline, deadline_ord = row
+        return Task(text, category, priority, deadline if deadline_ord is None else deadline_ord,
+                    done=bool(done), date=date, id=task_id)
+
+
+    def load(self):
+        rows = self._connect().execute(
+            'SELECT id, text, category, priority, date, done, deadline, deadline_ord FROM tasks ORDER BY id').fetchall()
+        self.bytes_read += self.path.stat().st_size
+        return list(map(self._task_from_row, rows))
+
+
+    def iter_tasks(self, start=0, category=None):
+        where, params = ('WHERE category_key = ? ', [category.lower()]) if category is not None else ('', [])
+        cursor = self._connect().execute(
+            'SELECT id, text, category, priority, date, done, deadline, deadline_ord FROM tasks '
+            + where + 'ORDER BY id LIMIT -1 OFFSET ?', params + [start])
+        return map(self._task_from_row, cursor)
+
+
+    def save(self, tasks):
+        connection = self._connect()
+        with connection:
+            connection.execute('DELETE FROM tasks')
+            insert_tasks(connection, tasks)
+        logging.info("Saved %s tasks to %s", len(tasks), self.path.name)
+
+
+    def record_many(self, tasks, records):
+        connection = self._connect()
+        with connection:
+            for op, task in records:
+                if op == 'add':
+                    connection.execute(INSERT_TASK_SQL, task_row(task))
+                elif op == 'complete':
+                    connection.execute('UPDATE tasks SET done = 1 WHERE id = ?', (task.id,))
+                elif op == 'delete':
+                    connection.execute('DELETE FROM tasks WHERE id = ?', (task.id,))
+                else:
+                    raise ValueError(f'Unknown operation: {op}')
+        logging.debug("Applied %s records to %s", len(records), self.path.name)
+
+
+    def query(self, tasks, category=None, priority=None, done=None, due_before=None, text_contains=None,
+              sort=None, limit=None, due_from=None):
+        # The table's primary key is the task id, so matching rows map straight
+        # to the loaded tasks.
+        clauses, params = [], []
+        if category is not None:
+            clauses.append('category_key = ?')
+            params.append(category.lower())
+        if priority is not None:
+            clauses.append('priority = ?')
+            params.append(priority)
+        if done is not None:
+            clauses.append('done = ?')
+            params.append(int(done))
+        if due_before is not None:
+            clauses.append('deadline_ord < ?')
+            params.append(due_before)
+        if due_from is not None:
+            clauses.append('deadline_ord >= ?')
+            params.append(due_from)
+
+        sql = 'SELECT id FROM tasks'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+
+        # SQLite's lower() only folds ASCII, so text matching, and the sorts it
+        # has no column for, are finished in Python on the indexed matches.
+        order = SQL_ORDER.get(sort[1:] if sort and sort.startswith('-') else sort or 'id')
+        pushed = text_contains is None and order is not None
+        if pushed:
+            direction = ' DESC' if sort and sort.startswith('-') else ''
+            if due_before is not None or due_from is not None:
+                # NULL deadlines are filtered out, and without the NULL test
+                # SQLite can read the rows in deadline index order
+                order = [term for term in order if not term.endswith('IS NULL')]
+            sql += ' ORDER BY ' + ', '.join(term + direction for term in order)
+            if limit is not None:
+                sql += ' LIMIT ?'
+                params.append(limit)
+        else:
+            sql += ' ORDER BY id'
+
+        matches = [tasks[task_id] for (task_id,) in self._connect().execute(sql, params)]
+        # SQLite resolves the filter through its indexes; only matching rows are read.
+        self.last_scanned = len(matches)
+        if not pushed:
+            matches = list(order_tasks(iter_matches(matches, text_contains=text_contains), sort, limit))
+        return matches
+
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.execute('PRAGMA optimize')
+            self.connection.close()
+            self.connection = None
+
+
+
+
+# ORDER BY terms matching ordering.SORT_KEYS; the other keys are sorted in Python.
+SQL_ORDER = {
+    'id': ('id',),
+    'deadline': ('deadline_ord IS NULL', 'deadline_ord', 'id'),
+    'priority': ("CASE priority WHEN 'High' THEN 0 WHEN 'Medium' THEN 1 WHEN 'Low' THEN 2 ELSE 3 END", 'id'),
+}
+
+INSERT_TASK_SQL = ('INSERT INTO tasks (id, text, category, priority, date, done, deadline, category_key, deadline_ord) '
+                   'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+
+def task_row(task: Task) -> tuple:
+    return (task.id, task.text, task.category, task.priority, format_date(task.date), int(task.done),
+            format_date(task.deadline), task.category.lower(),
+            task.deadline if isinstance(task.deadline, int) else None)
+
+
+def insert_tasks(connection, tasks):
+    connection.executemany(INSERT_TASK_SQL, (task_row(task) for task in tasks))
+
+
+def migrate_json_to_sqlite(json_path, connection):
+    tasks = list(map(Task.from_dict, iter_json_file(json_path), count(1)))
+    with connection:
+        insert_tasks(connection, tasks)
+    logging.info("Migrated %s tasks from %s to SQLite", len(tasks), Path(json_path).name)
+    return len(tasks)
+
+
+
+
+class ShardedStorage(JsonStorage):
+    # A directory named after the list holding one NDJSON shard per category,
+    # so a change only rewrites the shards of the categories it touches (adds
+    # are appended) and one category can be read without the others. A full
+    # load reads the shards in parallel and merges them back into id order.
+    # Every row keeps its category; file names are only ever derived from it.
+    name = 'sharded'
+    partitioned = True
+
+    def __init__(self, path='tasks.json', codec=None, workers=None):
+        self.json_path = Path(path)
+        super().__init__(self.json_path.with_suffix(''), codec)
+        # the list's lock, so its generation and last id carry over from json
+        self.lock = FileLock(self.json_path.with_name(self.json_path.name + '.lock'))
+        self.workers = workers
+        # lowercase category -> {id: task} for every shard, in id order
+        self.shards = {}
+        # set when shards were found under names this version does not use
+        self.stale = False
+
+
+    @staticmethod
+    def shard_name(key):
+        # Categories match case-insensitively. The prefix keeps the name from
+        # being empty or hidden, the quoted start of the category makes the
+        # directory readable and is cut short to stay within file name limits,
+        # and the hash tells apart categories that start alike.
+        import hashlib
+        digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+        return f'c-{quote(key, safe="")[:SHARD_NAME_LIMIT]}-{digest}.ndjson'
+
+
+    def _shard_paths(self):
+        try:
+            return sorted(path for path in self.path.iterdir() if path.name.endswith('.ndjson'))
+        except FileNotFoundError:
+            return []
+
+
+    def exists(self):
+        return self.path.is_dir() or self.json_path.exists()
+
+
+    def signature(self):
+        # flat, so it survives the JSON round trip of sidecar stamps unchanged
+        if not self.path.is_dir():
+            return stat_signature(self.json_path)
+        signature = []
+        for path in self._shard_paths():
+            signature.append(path.name)
+            signature.extend(stat_signature(path) or ())
+        return tuple(signature)
+
+
+    def _read_shard(self, path):
+        return list(map(Task.from_dict, iter_json_file(path, self.codec.decode)))
+
+
+    def load(self):
+        if not self.path.is_dir():
+            # a list kept in one file before it was sharded; the first change splits it
+            self.bytes_read += self.json_path.stat().st_size
+            tasks = list(map(Task.from_dict, iter_json_file(self.json_path, self.codec.decode), count(1)))
+            paths = []
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            paths = self._shard_paths()
+            self.bytes_read += sum(path.stat().st_size for path in paths)
+            with ThreadPoolExecutor(self.workers, thread_name_prefix='shard-loader') as pool:
+                parts = list(pool.map(self._read_shard, paths))
+            # each shard is already in id order, which Timsort merges in linear time
+            tasks = sorted((task for part in parts for task in part), key=lambda task: task.id)
+            logging.debug("Read %s shards of %s", len(paths), self.path.name)
+
+        self.shards = {}
+        for task in tasks:
+            self.shards.setdefault(task.category.lower(), {})[task.id] = task
+        names = {self.shard_name(key) for key in self.shards}
+        self.stale = any(path.name not in names for path in paths)
+        return tasks
+
+
+    def iter_tasks(self, start=0, category=None):
+        if not self.path.is_dir():
+            return islice(self.load(), start, None) if self.json_path.exists() else iter(())
+        if category is not None:
+            path = self.path / self.shard_name(category.lower())
+            if not path.exists():
+                return iter(())
+            self.bytes_read += path.stat().st_size
+            return islice(map(Task.from_dict, iter_json_file(path, self.codec.decode)), start, None)
+
+        paths = self._shard_paths()
+        self.bytes_read += sum(path.stat().st_size for path in paths)
+        streams = [map(Task.from_dict, iter_json_file(path, self.codec.decode)) for path in paths]
+        return islice(heapq.merge(*streams, key=lambda task: task.id), start, None)
+
+
+    def save(self, tasks):
+        self.shards = {}
+        for task in tasks:
+            self.shards.setdefault(task.category.lower(), {})[task.id] = task
+        self.path.mkdir(exist_ok=True)
+        for key in self.shards:
+            self._write_shard(key)
+        names = {self.shard_name(key) for key in self.shards}
+        for path in self._shard_paths():
+            if path.name not in names:
+                path.unlink()
+        self.stale = False
+        logging.info("Saved %s tasks to %s shards in %s", len(tasks), len(self.shards), self.path.name)
+
+
+    def _write_shard(self, key):
+        path = self.path / self.shard_name(key)
+        members = self.shards.get(key)
+        if not members:
+            self.shards.pop(key, None)
+            path.unlink(missing_ok=True)
+            return
+        lines = (self.codec.encode(task.to_dict()) + b'\n' for task in members.values())
+        self.bytes_written += write_atomic(path, lines)
+
+
+    def record_many(self, tasks, records):
+        if not records:
+            return
+        if not self.path.is_dir() or self.stale:
+            # first change to a list kept in one file, or shards to rename
+            self.save(tasks)
+            return
+
+        rewrite, appended = set(), {}
+        for op, task in records:
+            key = task.category.lower()
+            members = self.shards.setdefault(key, {})
+            if op == 'add':
+                members[task.id] = task
+                appended.setdefault(key, []).append(task)
+            elif op == 'complete':
+                members[task.id] = task
+                rewrite.add(key)
+            elif op == 'delete':
+                members.pop(task.id, None)
+                rewrite.add(key)
+            else:
+                raise ValueError(f'Unknown operation: {op}')
+
+        for key in rewrite:
+            self._write_shard(key)
+        for key, added in appended.items():
+            if key not in rewrite:
+                repair_tail(self.path / self.shard_name(key), self.codec.decode)
+                with open(self.path / self.shard_name(key), 'ab') as f:
+                    start = f.tell()
+                    write_ndjson(f, added, self.codec)
+                    self.bytes_written += f.tell() - start
+        logging.debug("Wrote %s shard(s) of %s", len(rewrite | appended.keys()), self.path.name)
+
+
+
+
+TASK_FIELDS = ('id', 'text', 'category', 'priority', 'date', 'done', 'deadline')
+FILE_FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+def file_format(path, fmt=None):
+    fmt = fmt or FILE_FORMATS.get(Path(path).suffix.lower())
+    if fmt not in ('csv', 'ndjson'):
+        raise ValueError(f'Cannot tell the format of {Path(path).name}, use csv or ndjson')
+    return fmt
+
+
+REQUIRED_FIELDS = ('text', 'category', 'priority', 'deadline')
+
+
+def task_from_record(data: dict) -> Task:
+    # Imported rows may leave out the creation date and status. Their ids are
+    # ignored; TaskManager gives imported tasks new ones.
+    if not isinstance(data, dict):
+        raise ValueError('expected an object with the task fields')
+    for field in REQUIRED_FIELDS:
+        if not isinstance(data.get(field), str):
+            raise ValueError(f'missing {field}')
+    if data['priority'] not in PRIORITY_RANK:
+        raise ValueError(f'priority must be Low, Medium or High, not {data["priority"]!r}')
+    if parse_date(data['deadline']) is None:
+        raise ValueError(f'deadline {data["deadline"]!r} is not a valid DD-MM-YYYY date')
+    done = data.get('done', False)
+    if isinstance(done, str):
+        done = done.strip().lower() in ('1', 'true', 'yes', 'y')
+    return Task(data['text'], data['category'], data['priority'], data['deadline'],
+                done=bool(done), date=data.get('date') or None)
+
+
+def read_tasks_file(path, fmt=None):
+    # A bad row raises ValueError naming its line and what is wrong with it.
+    fmt = file_format(path, fmt)
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            import csv
+            reader = csv.DictReader(f)
+            rows = ((reader.line_num, row) for row in reader)
+        else:
+            rows = ((number, line) for number, line in enumerate(f, 1) if line.strip())
+        for number, row in rows:
+            try:
+                task = task_from_record(row if fmt == 'csv' else json.loads(row))
+            except ValueError as e:
+                raise ValueError(f'{Path(path).name}, line {number}: {e}') from None
+            yield task
+
+
+def write_tasks_file(path, tasks, fmt=None):
+    if file_format(path, fmt) == 'ndjson':
+        with open(path, 'wb') as f:
+            return write_ndjson(f, tasks, get_codec())
+
+    import csv
+    written = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=TASK_FIELDS)
+        writer.writeheader()
+        for task in tasks:
+            writer.writerow(task.to_dict())
+            written += 1
+    return written
+
+
+
+
+STORAGE_BACKENDS = {
+    JsonStorage.name: JsonStorage,
+    NdjsonStorage.name: NdjsonStorage,
+    JournalStorage.name: JournalStorage,
+    SqliteStorage.name: SqliteStorage,
+    ShardedStorage.name: ShardedStorage,
+}
+
+
+def list_path(root=None, name=None):
+    # Every list is <name>.json in the root directory, or the files a backend
+    # derives from that path. Without either, it is tasks.json right here.
+    root = Path(root or os.environ.get('TODO_ROOT', '.'))
+    name = name or os.environ.get('TODO_LIST', 'tasks')
+    if name in ('.', '..') or Path(name).name != name:
+        raise ValueError(f'Invalid list name: {name}')
+    return root / f'{name}.json'
+
+
+def make_storage(name=None, path=None):
+    name = (name or os.environ.get('TODO_STORAGE', 'json')).lower()
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f'Unknown storage backend: {name}')
+    path = list_path() if path is None else Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return STORAGE_BACKENDS[name](path)
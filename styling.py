@@ -0,0 +1,96 @@
+from datetime import date
+from functools import lru_cache
+from models import format_date
+import sys
+import os
+
+
+# Colours are colorama names, looked up the first time something is painted,
+# so plain output never imports colorama.
+PRIORITY_COLORS = {'High': 'RED', 'Medium': 'YELLOW'}
+# overdue, due within three days, later
+DEADLINE_COLORS = ('RED', 'YELLOW', 'GREEN')
+
+
+def supports_color(stream=None) -> bool:
+    # NO_COLOR (https://no-color.org) always wins and FORCE_COLOR comes next;
+    # otherwise colour only goes to a terminal that can show it.
+    if os.environ.get('NO_COLOR'):
+        return False
+    if os.environ.get('FORCE_COLOR'):
+        return True
+    if os.environ.get('TERM') == 'dumb':
+        return False
+    isatty = getattr(stream or sys.stdout, 'isatty', None)
+    try:
+        return bool(isatty and isatty())
+    except ValueError:
+        # closed stream
+        return False
+
+
+def deadline_bucket(deadline: int, today: int) -> int:
+    days_left = deadline - today
+    return 0 if days_left < 0 else 1 if days_left <= 3 else 2
+
+
+# Everything below is memoized on its arguments: the value, its colour bucket
+# and whether colour is on. A table only ever shows a handful of distinct
+# priorities, statuses and deadlines, so rows reuse the same strings.
+
+def paint(text: str, color: str, enabled: bool = True) -> str:
+    # plain text skips the cache altogether
+    if not enabled:
+        return text
+    return _paint(text, color)
+
+
+@lru_cache(maxsize=1024)
+def _paint(text: str, color: str) -> str:
+    from colorama import Fore, Style
+    code = Style.BRIGHT if color == 'BRIGHT' else getattr(Fore, color)
+    return code + text + Style.RESET_ALL
+
+
+def colorize_priority(priority: str, enabled: bool = True) -> str:
+    return paint(priority, PRIORITY_COLORS.get(priority, 'GREEN'), enabled)
+
+
+@lru_cache(maxsize=4096)
+def _colorize_deadline(deadline: int, bucket: int, enabled: bool) -> str:
+    return paint(format_date(deadline), DEADLINE_COLORS[bucket], enabled)
+
+
+def colorize_deadline(deadline, today=None, enabled: bool = True) -> str:
+    # pass today when colouring many deadlines, so the clock is read once
+    if not isinstance(deadline, int):
+        return deadline
+    if today is None:
+        today = date.today().toordinal()
+    return _colorize_deadline(deadline, deadline_bucket(deadline, today), enabled)
+
+
+def colorize_status(done: bool, enabled: bool = True) -> str:
+    if done:
+        return paint('✅ Completed', 'GREEN', enabled)
+    else:
+        return paint('❌ Not completed', 'RED', enabled)
+
+
+def style_tittle(title: str, enabled: bool = True) -> str:
+    return paint(title, 'BRIGHT', enabled)
+
+
+@lru_cache(maxsize=1024)
+def colored_aligned(text: str, width: int, color='RESET', align='^', enabled: bool = True) -> str:
+    return paint(f"{text:{align}{width}}", color, enabled)
+
+
+def priority_cell(priority: str, enabled: bool = True) -> str:
+    return colored_aligned(priority, 10, PRIORITY_COLORS.get(priority, 'GREEN'), '^', enabled)
+
+
+def deadline_cell(deadline, today: int, enabled: bool = True) -> str:
+    if not isinstance(deadline, int):
+        return f'{deadline:<10}'
+    return _colorize_deadline(deadline, deadline_bucket(deadline, today), enabled)
@@ -1,460 +1,914 @@
-from colorama import Fore, Style
-from datetime import datetime, timedelta
-from models import Task
-from pathlib import Path
-import logging
-import json
-
-
-def colorize_priority(priority: str) -> str:
-    if priority == "High":
-        return Fore.RED + priority + Style.RESET_ALL
-    elif priority == "Medium":
-        return Fore.YELLOW + priority + Style.RESET_ALL
-    else:
-        return Fore.GREEN + priority + Style.RESET_ALL
-
-
-def colorize_deadline(deadline_str: str) -> str:
-    try:
-        deadline = datetime.strptime(deadline_str, "%d-%m-%Y").date()
-        days_left = (deadline - datetime.today().date()).days
-
-        if days_left < 0:
-            return Fore.RED + deadline_str + Style.RESET_ALL
-        elif days_left <= 3:
-            return Fore.YELLOW + deadline_str + Style.RESET_ALL
-        else:
-            return Fore.GREEN + deadline_str + Style.RESET_ALL
-
-    except Exception:
-        return deadline_str
-
-
-def colorize_status(done: bool) -> str:
-    if done:
-        return Fore.GREEN + '✅ Completed' + Style.RESET_ALL
-    else:
-        return Fore.RED + '❌ Not completed'+ Style.RESET_ALL
-
-
-def style_tittle(title: str) -> str:
-    return Style.BRIGHT + title + Style.RESET_ALL
-
-
-def colored_aligned(text: str, width: int, color=Fore.RESET, align='^') -> str:
-    formatted = f"{text:{align}{width}}"
-    return f"{color}{formatted}{Style.RESET_ALL}"
-
-
-
-
-logging.basicConfig(
-    filename='todo.log',
-    level=logging.DEBUG,
-    format='[%(asctime)s] %(levelname)s: %(message)s'
-)
-
-
-class TaskManager:
-    def __init__(self):
-        self.tasks = []
-
-
-    def load_data(self):
-        path = Path('tasks.json')
-        logging.debug(f"Checking if file exists at {path.resolve()}")
-        if path.exists():
-            try:
-                with open('tasks.json', 'r', encoding='utf-8') as f:
-                    self.tasks = json.load(f)
-                logging.info(f"Loaded {len(self.tasks)} tasks from {path.name}")
-
-            except json.JSONDecodeError as e:
-                print('Error: tasks.json contained invalid JSON.')
-                logging.error(f"JSONDecodeError while loading {path.name}: {e}")
-            except OSError as e:
-                print(f'Error: Failed to read file: {e}')
-                logging.error(f"OSError while reading {path.name}: {e}")
-
-        else:
-            logging.warning(f"File {path.name} not found. Starting with empty task list.")
-
-
-
-
-    def save_data(self):
-        path = Path('tasks.json')
-        try:
-            with open('tasks.json', 'w', encoding='utf-8') as f:
-                json.dump(self.tasks, f, ensure_ascii=False, indent=4)
-            logging.info(f"Saved {len(self.tasks)} tasks to {path.name}")
-
-        except OSError as e:
-            logging.error(f"Failed to write to {path.name}: {e}")
-
-
-
-
-    def add_task(self):
-        try:
-            input_new_task_text = input('Input new task text or exit: ').strip()
-            logging.debug(f"User entered task text: '{input_new_task_text}'")
-
-            if input_new_task_text.lower() == 'exit':
-                print('Returning to menu...')
-                logging.info('User exited task addition.')
-                return
-
-            input_new_task_category = input('Input new task category: ').strip()
-            logging.debug(f'User entered task category: "{input_new_task_category}"')
-
-            print('Input new task priority:\n[1] Low\n[2] Medium\n[3] High')
-            input_priority_choice = int(input('> '))
-            logging.debug(f"User selected priority option: {input_priority_choice}")
-
-            if input_priority_choice in range(1, 4):
-                if input_priority_choice == 1:
-                    selected_priority_level = 'Low'
-                elif input_priority_choice == 2:
-                    selected_priority_level = 'Medium'
-                else:
-                    selected_priority_level = 'High'
-                logging.debug(f"Mapped priority level: {selected_priority_level}")
-            else:
-                print('Error: Input out of range.')
-                logging.warning(f"Invalid priority input: {input_priority_choice}")
-                return
-
-            input_days_until_deadline = int(input('Input days until deadline: '))
-            logging.debug(f"User entered deadline in days: {input_days_until_deadline}")
-
-            deadline = datetime.today() + timedelta(days=input_days_until_deadline)
-            deadline_str = deadline.strftime("%d-%m-%Y")
-            logging.debug(f"Calculated deadline date: {deadline_str}")
-
-            new_task = Task(input_new_task_text, input_new_task_category, selected_priority_level, deadline)
-            self.tasks.append(new_task.to_dict())
-            self.save_data()
-
-            print(f'Task "{new_task.text}" added!')
-            logging.info(f'Task added: {new_task.text}, Category: {new_task.category}, Priority: {new_task.priority}, Deadline: {deadline_str}')
-
-
-        except ValueError as e:
-            print('Error: Invalid input.')
-            logging.error(f'ValueError in add_task: {e}')
-
-
-
-
-    def delete_task(self):
-        if len(self.tasks) == 0:
-            print('Error: Task list is empty.')
-            logging.warning('Attempted to delete task, but task list was empty.')
-            return
-
-        logging.debug(f"Task list loaded with {len(self.tasks)} tasks.")
-
-        max_text_len = max(max([len(task["text"]) for task in self.tasks]), len("text"))
-        max_category_len = max(max(len(task["category"]) for task in self.tasks), len("Category"))
-
-        logging.debug(f"Calculated max_text_len={max_text_len}, max_category_len={max_category_len}")
-
-        print('\n' + '=' * (max_text_len + max_category_len + 68))
-        print('Task list'.center((max_text_len + max_category_len + 68)))
-        print('=' * (max_text_len + max_category_len + 68))
-
-        print(f'{"№":^3} | {"Text":^{max_text_len}} | {"Category":^{max_category_len}} | {"Priority":^10} | {"Date":^10} | {"Deadline":^10} | {"Status":^16}')
-        print('-' * (max_text_len + max_category_len + 68))
-
-        for index, task in enumerate(self.tasks):
-            priority = task["priority"]
-            color = Fore.RED if priority == "High" else Fore.YELLOW if priority == "Medium" else Fore.GREEN
-            priority_colored = colored_aligned(priority, 10, color)
-            deadline_colored = colorize_deadline(task["deadline"])
-            status_colored = colorize_status(task["done"])
-            print(
-                f'{index + 1:^3} | {task["text"]:<{max_text_len}} | {task["category"]:^{max_category_len}} | {priority_colored:^10} | {task["date"]:<10} | {deadline_colored:<10} | {status_colored:^16}')
-
-
-        input_index = input('\nEnter the task number to delete or exit: ').strip()
-        logging.debug(f"User entered index: {input_index}")
-
-        if input_index.lower() == 'exit':
-            print('Returning to menu...')
-            logging.info('User cancelled task deletion (exit).')
-            return
-
-        try:
-            if 0 <= int(input_index) - 1 <= len(self.tasks):
-                logging.debug(f"Selected task for deletion: {self.tasks[int(input_index) - 1]['text']}")
-                input_choice = input(f'Are you sure to delete this task "{self.tasks[int(input_index) - 1]["text"]}" ? (y/n): ')
-                logging.debug(f"User confirmation: {input_choice}")
-
-                if input_choice.lower() == 'n' or input_choice.lower() == 'no':
-                    print('Returning to menu...')
-                    logging.info(f'Task deletion of "{self.tasks[int(input_index) - 1]['text']}" cancelled by user.')
-                    return
-                else:
-                    self.tasks.pop(int(input_index) - 1)
-                    print('The selected task has been deleted!')
-                    self.save_data()
-                    logging.info(f'Task "{self.tasks[int(input_index) - 1]['text']}" was successfully deleted.')
-
-            else:
-                print('Error: Invalid input.')
-                logging.warning(f'User tried to delete invalid task index: {input_index}')
-
-        except ValueError as e:
-            print('Error: Invalid input.')
-            logging.error(f'ValueError while parsing input index: {input_index}, Exception: {e}')
-
-
-
-
-    def show_tasks(self):
-        if len(self.tasks) == 0:
-            print('Error: Task list is empty.')
-            logging.warning("User attempted to view tasks, but task list is empty")
-            return
-
-        logging.info(f"Displaying {len(self.tasks)} tasks")
-
-        max_text_len = max(max([len(task["text"]) for task in self.tasks]), len("text"))
-        max_category_len = max(max(len(task["category"]) for task in self.tasks), len("Category"))
-
-        print('\n' + '=' * (max_text_len + max_category_len + 68))
-        print(style_tittle('Tasks list').center((max_text_len + max_category_len + 68)))
-        print('=' * (max_text_len + max_category_len + 68))
-
-        print(f'{"№":^3} | {"Text":^{max_text_len}} | {"Category":^{max_category_len}} | {"Priority":^10} | {"Date":^10} | {"Deadline":^10} | {"Status":^16}')
-        print('-' * (max_text_len + max_category_len + 68))
-
-        for index, task in enumerate(self.tasks):
-            priority = task["priority"]
-            color = Fore.RED if priority == "High" else Fore.YELLOW if priority == "Medium" else Fore.GREEN
-            priority_colored = colored_aligned(priority, 10, color)
-            deadline_colored = colorize_deadline(task["deadline"])
-            status_colored = colorize_status(task["done"])
-            print(f'{index + 1:^3} | {task["text"]:<{max_text_len}} | {task["category"]:^{max_category_len}} | {priority_colored:^10} | {task["date"]:<10} | {deadline_colored:<10} | {status_colored:^16}')
-
-
-
-
-    def complete_task(self):
-        if len(self.tasks) == 0:
-            print('Error: Task list is empty.')
-            logging.warning("Cannot complete task — list is empty")
-            return
-
-        uncompleted_tasks = [task for task in self.tasks if not task["done"]]
-
-        if not uncompleted_tasks:
-            print('Error: Uncompleted tasks list is empty.')
-            logging.warning("No uncompleted tasks found")
-            return
-
-        logging.info(f"User is viewing {len(uncompleted_tasks)} uncompleted tasks")
-
-        max_text_len = max(max([len(task["text"]) for task in self.tasks]), len("text"))
-        max_category_len = max(max(len(task["category"]) for task in self.tasks), len("Category"))
-
-        print('\n' + '=' * (max_text_len + max_category_len + 68))
-        print(style_tittle('List of uncompleted tasks'.center((max_text_len + max_category_len + 68))))
-        print('=' * (max_text_len + max_category_len + 68))
-
-        print(f'{"№":^3} | {"Text":^{max_text_len}} | {"Category":^{max_category_len}} | {"Priority":^10} | {"Date":^10} | {"Deadline":^10} | {"Status":^16}')
-        print('-' * (max_text_len + max_category_len + 68))
-
-        for index, task in enumerate(self.tasks):
-            if not task["done"]:
-                priority = task["priority"]
-                color = Fore.RED if priority == "High" else Fore.YELLOW if priority == "Medium" else Fore.GREEN
-                priority_colored = colored_aligned(priority, 10, color)
-                deadline_colored = colorize_deadline(task["deadline"])
-                status_colored = colorize_status(task["done"])
-                print(
-                    f'{index + 1:^3} | {task["text"]:<{max_text_len}} | {task["category"]:^{max_category_len}} | {priority_colored:^10} | {task["date"]:<10} | {deadline_colored:<10} | {status_colored:^16}')
-
-        input_index = input('\nEnter the task number to complete or exit: ').strip()
-        if input_index.lower() == 'exit':
-            print('Returning to menu...')
-            logging.debug("User exited from task completion prompt")
-            return
-
-        try:
-            if 0 <= int(input_index) - 1 <= len(self.tasks):
-                input_choice = input(f'Are you sure to complete this task "{self.tasks[int(input_index) - 1]["text"]}" ? (y/n): ')
-                if input_choice.lower() == 'n' or input_choice.lower() == 'no':
-                    print('Returning to menu...')
-                    logging.debug(f'User canceled completion of task: "{self.tasks[int(input_index) - 1]["text"]}"')
-                    return
-                else:
-                    self.tasks[int(input_index) - 1]['done'] = True
-                    print('The selected task has been completed!')
-                    logging.info(f'Task marked as completed: "{self.tasks[int(input_index) - 1]["text"]}"')
-                    self.save_data()
-
-
-            else:
-                print('Error: Invalid input.')
-                logging.warning(f'Invalid task number entered: {input_index}')
-
-        except ValueError:
-            print('Error: Invalid input.')
-            logging.error(f'ValueError during task completion — input was: "{input_index}"')
-
-
-
-
-    def find_by_category(self):
-        if len(self.tasks) == 0:
-            print('Error: Task list is empty.')
-            logging.warning("Cannot search by category — task list is empty")
-            return
-
-        input_category = input('\nEnter the task category to search for: ').strip()
-        logging.info(f"User is searching for tasks in category: {input_category}")
-
-        tasks_in_input_category = [task for task in self.tasks if task["category"].lower() == input_category.lower()]
-
-        if not tasks_in_input_category:
-            print('Error: No tasks in the given category.')
-            logging.warning(f'No tasks found in category: {input_category}')
-            return
-
-        logging.info(f"Found {len(tasks_in_input_category)} task(s) in category '{input_category}'")
-
-        max_text_len = max(max([len(task["text"]) for task in self.tasks]), len("text"))
-        max_category_len = max(max(len(task["category"]) for task in self.tasks), len("Category"))
-
-        print('\n' + '=' * (max_text_len + max_category_len + 68))
-        print(style_tittle('List of tasks in the given category'.center((max_text_len + max_category_len + 68))))
-        print('=' * (max_text_len + max_category_len + 68))
-
-        print(f'{"№":^3} | {"Text":^{max_text_len}} | {"Category":^{max_category_len}} | {"Priority":^10} | {"Date":^10} | {"Deadline":^10} | {"Status":^16}')
-        print('-' * (max_text_len + max_category_len + 68))
-
-        for index, task in enumerate(self.tasks):
-            if task["category"].lower() == input_category.lower():
-                priority = task["priority"]
-                color = Fore.RED if priority == "High" else Fore.YELLOW if priority == "Medium" else Fore.GREEN
-                priority_colored = colored_aligned(priority, 10, color)
-                deadline_colored = colorize_deadline(task["deadline"])
-                status_colored = colorize_status(task["done"])
-                print(f'{index + 1:^3} | {task["text"]:<{max_text_len}} | {task["category"]:^{max_category_len}} | {priority_colored:^10} | {task["date"]:<10} | {deadline_colored:<10} | {status_colored:^16}')
-
-
-
-
-    def find_by_priority(self):
-        if len(self.tasks) == 0:
-            print('Error: Task list is empty.')
-            logging.warning("Cannot search by priority — task list is empty")
-            return
-
-        try:
-            print('Select a priority level')
-            print('[1] Low\n[2] Medium\n[3] High')
-
-            input_choice = int(input('> '))
-            logging.debug(f"User selected priority option: {input_choice}")
-
-            if input_choice in range(1, 4):
-                if input_choice == 1:
-                    input_priority = 'Low'
-                elif input_choice == 2:
-                    input_priority = 'Medium'
-                else:
-                    input_priority = 'High'
-
-            else:
-                print('Error: Input out of range.')
-                logging.warning(f"Priority selection out of range: {input_choice}")
-                return
-
-            logging.info(f"User is searching tasks with priority: {input_priority}")
-
-            tasks_with_input_priority = [task for task in self.tasks if task['priority'] == input_priority]
-
-            if not tasks_with_input_priority:
-                print('Error: No tasks in the given priority level.')
-                logging.warning(f"No tasks found with priority: {input_priority}")
-                return
-
-            logging.info(f'Found {len(tasks_with_input_priority)} task(s) with priority "{input_priority}"')
-
-            max_text_len = max(max([len(task["text"]) for task in self.tasks]), len("text"))
-            max_category_len = max(max(len(task["category"]) for task in self.tasks), len("Category"))
-
-            print('\n' + '=' * (max_text_len + max_category_len + 68))
-            print(style_tittle('List of tasks in the given priority level'.center((max_text_len + max_category_len + 68))))
-            print('=' * (max_text_len + max_category_len + 68))
-
-            print(f'{"№":^3} | {"Text":^{max_text_len}} | {"Category":^{max_category_len}} | {"Priority":^10} | {"Date":^10} | {"Deadline":^10} | {"Status":^16}')
-            print('-' * (max_text_len + max_category_len + 68))
-
-            for index, task in enumerate(self.tasks):
-                if task["priority"] == input_priority:
-                    priority = task["priority"]
-                    color = Fore.RED if priority == "High" else Fore.YELLOW if priority == "Medium" else Fore.GREEN
-                    priority_colored = colored_aligned(priority, 10, color)
-                    deadline_colored = colorize_deadline(task["deadline"])
-                    status_colored = colorize_status(task["done"])
-                    print(f'{index + 1:^3} | {task["text"]:<{max_text_len}} | {task["category"]:^{max_category_len}} | {priority_colored:^10} | {task["date"]:<10} | {deadline_colored:<10} | {status_colored:^16}')
-
-        except ValueError as e:
-            print('Error: Invalid input.')
-            logging.error(f"ValueError during priority input: {e}")
-
-
-
-
-    def find_overdue_tasks(self):
-        if len(self.tasks) == 0:
-            print('Error: Task list is empty.')
-            logging.warning("Cannot search for overdue tasks — task list is empty")
-            return
-
-        overdue_tasks = []
-        for task in self.tasks:
-            try:
-                deadline = datetime.strptime(task["deadline"], '%d-%m-%Y').date()
-                if (deadline - datetime.today().date()).days < 0:
-                    overdue_tasks.append(task)
-            except (ValueError, TypeError) as e:
-                print(f'Error: invalid deadline in task "{task['text']}"')
-                logging.error(f'Invalid deadline format in task "{task['text']}": {e}')
-
-        if not overdue_tasks:
-            print('Error: No overdue tasks found.')
-            logging.info("No overdue tasks found")
-            return
-
-        logging.info(f"Found {len(overdue_tasks)} overdue task(s)")
-
-        max_text_len = max(max([len(task["text"]) for task in self.tasks]), len("text"))
-        max_category_len = max(max(len(task["category"]) for task in self.tasks), len("Category"))
-
-        print('\n' + '=' * (max_text_len + max_category_len + 68))
-        print(style_tittle('List of overdue tasks'.center((max_text_len + max_category_len + 68))))
-        print('=' * (max_text_len + max_category_len + 68))
-
-        print(f'{"№":^3} | {"Text":^{max_text_len}} | {"Category":^{max_category_len}} | {"Priority":^10} | {"Date":^10} | {"Deadline":^10} | {"Status":^16}')
-        print('-' * (max_text_len + max_category_len + 68))
-
-        for index, task in enumerate(self.tasks):
-            try:
-                deadline = datetime.strptime(task["deadline"], '%d-%m-%Y').date()
-                if (deadline - datetime.today().date()).days < 0:
-                    priority = task["priority"]
-                    color = Fore.RED if priority == "High" else Fore.YELLOW if priority == "Medium" else Fore.GREEN
-                    priority_colored = colored_aligned(priority, 10, color)
-                    deadline_colored = colorize_deadline(task["deadline"])
-                    status_colored = colorize_status(task["done"])
-                    print(f'{index + 1:^3} | {task["text"]:<{max_text_len}} | {task["category"]:^{max_category_len}} | {priority_colored:^10} | {task["date"]:<10} | {deadline_colored:<10} | {status_colored:^16}')
-
-            except (ValueError, TypeError) as e:
-                print(f'Error: invalid deadline in task "{task['text']}"')
-                logging.error(f"Invalid deadline format in task '{task['text']}': {e}")
\ No newline at end of file
+from datetime import date, datetime, timedelta
+from models import Task, format_date
+from styling import colorize_status, deadline_cell, priority_cell, style_tittle, supports_color
+from storage import iter_matches, make_storage
+from ordering import order_tasks, sort_key
+from indexes import TaskIndex
+from scheduler import DeadlineScheduler
+import instrumentation
+from itertools import islice
+import logging
+import sys
+import os
+
+
+def render_table(title: str, tasks, out=None) -> None:
+    # the № column shows task ids; widths only cover the tasks being shown
+    tasks = list(tasks)
+    id_width = max(len(str(max((task.id for task in tasks), default=0))), 3)
+    text_width = max(max((len(task.text) for task in tasks), default=0), len("Text"))
+    category_width = max(max((len(task.category) for task in tasks), default=0), len("Category"))
+    width = id_width + text_width + category_width + 65
+    out = out or sys.stdout
+    # decided once per table: plain text when piped, NO_COLOR or TERM=dumb
+    color = supports_color(out)
+    today = date.today().toordinal()
+
+    lines = [
+        '',
+        '=' * width,
+        style_tittle(title.center(width), color),
+        '=' * width,
+        f'{"№":^{id_width}} | {"Text":^{text_width}} | {"Category":^{category_width}} | {"Priority":^10} | {"Date":^10} | {"Deadline":^10} | {"Status":^16}',
+        '-' * width,
+    ]
+    # Cells that only depend on a priority, a status or a date are built once
+    # per render; the styled strings themselves are memoized across renders.
+    date_cells = {}
+    deadline_cells = {}
+    priority_cells = {}
+    status_cells = {True: colorize_status(True, color), False: colorize_status(False, color)}
+    append = lines.append
+    for task in tasks:
+        date_text = date_cells.get(task.date)
+        if date_text is None:
+            date_text = date_cells[task.date] = f'{format_date(task.date):<10}'
+        deadline_text = deadline_cells.get(task.deadline)
+        if deadline_text is None:
+            deadline_text = deadline_cells[task.deadline] = deadline_cell(task.deadline, today, color)
+        priority_text = priority_cells.get(task.priority)
+        if priority_text is None:
+            priority_text = priority_cells[task.priority] = priority_cell(task.priority, color)
+
+        append(f'{task.id:^{id_width}} | {task.text.ljust(text_width)} | {task.category.center(category_width)} | '
+               f'{priority_text} | {date_text} | {deadline_text} | {status_cells[task.done]}')
+
+    lines.append('')
+    out.write('\n'.join(lines))
+
+
+DEADLINE_LABELS = {'overdue': 'Overdue', 'today': 'Due today', 'week': 'Due in 7 days', 'later': 'Due later',
+                   'undated': 'No valid deadline'}
+
+
+def render_statistics(summary, out=None) -> None:
+    # summary as returned by TaskManager.statistics()
+    out = out or sys.stdout
+    color = supports_color(out)
+    names = [row['name'] for row in summary['categories']] + list(DEADLINE_LABELS.values())
+    name_width = max(map(len, names))
+    width = name_width + 49
+
+    def percent(done, total):
+        return f'{100 * done / total:.1f}%' if total else '-'
+
+    def rows(title, entries, overdue):
+        header = f'{title:<{name_width}} | {"Total":>7} | {"Done":>7} | {"Open":>7} | {"Done %":>6}'
+        lines = [header + (f' | {"Overdue":>7}' if overdue else ''), '-' * width]
+        for row in entries:
+            line = (f'{row["name"]:<{name_width}} | {row["total"]:>7} | {row["done"]:>7} | '
+                    f'{row["total"] - row["done"]:>7} | {percent(row["done"], row["total"]):>6}')
+            lines.append(line + (f' | {row["overdue"]:>7}' if overdue else ''))
+        return lines + ['']
+
+    total, done = summary['total'], summary['done']
+    lines = [
+        '',
+        '=' * width,
+        style_tittle('Statistics'.center(width), color),
+        '=' * width,
+        f'Tasks: {total}, completed: {done} ({percent(done, total)}), open: {total - done}',
+        '',
+        *rows('Category', summary['categories'], True),
+        *rows('Priority', summary['priorities'], False),
+        'Open tasks by deadline',
+        '-' * width,
+        *(f'{DEADLINE_LABELS[bucket]:<{name_width}} | {count:>7}' for bucket, count in summary['deadlines'].items()),
+        '',
+    ]
+    out.write('\n'.join(lines))
+
+
+PAGE_SIZE = int(os.environ.get('TODO_PAGE_SIZE', 20))
+
+
+class StreamPager:
+    # Reads pages straight from storage. Moving to the next page continues the
+    # open iterator; going back or jumping reopens it at the requested offset.
+    def __init__(self, storage):
+        self.storage = storage
+        self._iterator = None
+        self._position = 0
+
+
+    def page(self, start, size):
+        if self._iterator is None or self._position != start:
+            self._iterator = self.storage.iter_tasks(start)
+        tasks = list(islice(self._iterator, size))
+        self._position = start + len(tasks)
+        return tasks
+
+
+
+
+class TaskManager:
+    def __init__(self, storage=None):
+        self.by_id = {}
+        self._view = []
+        self._last_id = 0
+        self.storage = storage or make_storage()
+        self.index = None if self.storage.pushdown else TaskIndex()
+        self.search_index = None
+        self.scheduler = DeadlineScheduler()
+        self.reminder = None
+        self.search_path = self.storage.path.with_name(self.storage.path.name + '.search')
+        self.stats = None
+        self.stats_path = self.storage.path.with_name(self.storage.path.name + '.stats')
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._signature = None
+        self._generation = None
+        self.metrics = instrumentation.metrics
+        if self.metrics is not None:
+            instrumentation.instrument(self)
+
+
+    def load_data(self, force=False):
+        path = self.storage.path
+        try:
+            with self.storage.lock.shared():
+                self._load(path, force)
+
+        except OSError as e:
+            print(f'Error: Failed to read file: {e}')
+            logging.error("OSError while reading %s: %s", path.name, e)
+
+
+
+
+    def _load(self, path, force):
+        # Runs under a shared lock, so writers in other processes wait until
+        # the tasks and their generation have been read together.
+        signature = self.storage.signature()
+        if not force and signature is not None and signature == self._signature:
+            self.cache_hits += 1
+            logging.debug("%s unchanged, using %s cached tasks", path.name, len(self.tasks))
+            return
+
+        self.cache_misses += 1
+        logging.debug("Checking if file exists at %s", path.resolve())
+        if self.storage.exists():
+            try:
+                self._set_tasks(self.storage.load())
+                self._signature = signature
+                self._generation = self.storage.generation()
+                self._last_id = max(self._last_id, self.storage.last_id())
+                # counters saved for this data are kept current from here on
+                self._load_stats(self._data_stamp())
+                logging.info("Loaded %s tasks from %s", len(self.tasks), path.name)
+
+            except ValueError as e:
+                # json, orjson and msgspec all raise ValueError subclasses
+                print(f'Error: {path.name} contained invalid JSON.')
+                logging.error("Invalid JSON while loading %s: %s", path.name, e)
+
+        else:
+            self._generation = self.storage.generation()
+            self._last_id = max(self._last_id, self.storage.last_id())
+            logging.warning("File %s not found. Starting with empty task list.", path.name)
+
+
+
+
+    @property
+    def tasks(self):
+        # Ordered view of by_id. A delete only drops the dict entry and leaves
+        # the view to be rebuilt on the next read, so deleting or completing
+        # by id is O(1) and a batch of deletes costs a single pass.
+        if self._view is None:
+            self._view = list(self.by_id.values())
+        return self._view
+
+
+
+
+    def _set_tasks(self, tasks):
+        self.by_id = {task.id: task for task in tasks}
+        self._view = tasks if len(self.by_id) == len(tasks) else None
+        self._last_id = max(self.by_id, default=0)
+        if self.index is not None:
+            self.index.rebuild(self.tasks)
+        self.scheduler.rebuild(self.tasks)
+        # loaded from their files or rebuilt when next needed
+        self.search_index = None
+        self.stats = None
+
+
+
+
+    def save_data(self):
+        # Rewrites the whole file. Every change was already written as it was
+        # made, so when another process wrote since, its version is loaded
+        # first rather than overwritten.
+        try:
+            with self.storage.lock.exclusive():
+                if self.storage.generation() != self._generation:
+                    self._rebase([])
+                self.storage.save(self.tasks)
+                self._generation = self.storage.bump_generation(self._last_id)
+                self._signature = self.storage.signature()
+
+        except OSError as e:
+            logging.error("Failed to write to %s: %s", self.storage.path.name, e)
+
+
+
+
+    def _record(self, op, task):
+        self._record_many([(op, task)])
+
+
+
+
+    def _record_many(self, records):
+        # records are (op, task) pairs and have already been applied to self.tasks
+        if not records:
+            return
+        try:
+            with self.storage.lock.exclusive():
+                if self.storage.generation() != self._generation:
+                    records = self._rebase(records)
+                # the dict view, so that after a delete only the backends that
+                # rewrite the whole file pay for walking every task
+                self.storage.record_many(self.by_id.values(), records)
+                self._generation = self.storage.bump_generation(self._last_id)
+                self._signature = self.storage.signature()
+
+        except OSError as e:
+            logging.error("Failed to write to %s: %s", self.storage.path.name, e)
+
+
+
+
+    def _rebase(self, records):
+        # Another process wrote since we loaded. Instead of overwriting its
+        # changes, replay ours on top of what is on disk now.
+        tasks = {task.id: task for task in (self.storage.load() if self.storage.exists() else [])}
+        last_id = max(max(tasks, default=0), self.storage.last_id())
+        rebased = []
+        for op, task in records:
+            if op == 'add':
+                # ids handed out by the other process may overlap ours
+                if task.id <= last_id:
+                    task.id = last_id + 1
+                last_id = task.id
+                tasks[task.id] = task
+                rebased.append((op, task))
+                continue
+
+            current = tasks.get(task.id)
+            if current is None or not current.same_as(task):
+                logging.info("Task %s was already deleted by another process", task.text)
+            elif op == 'complete':
+                if not current.done:
+                    current.done = True
+                    rebased.append((op, current))
+            else:
+                rebased.append((op, tasks.pop(task.id)))
+
+        logging.warning("%s changed since it was loaded, merged %s change(s) into %s tasks",
+                        self.storage.path.name, len(rebased), len(tasks))
+        self._set_tasks(list(tasks.values()))
+        self._last_id = last_id
+        return rebased
+
+
+
+
+    def create_task(self, text, category, priority, days_until_deadline):
+        try:
+            deadline = datetime.today() + timedelta(days=days_until_deadline)
+        except OverflowError:
+            raise ValueError(f'A deadline {days_until_deadline} days from today is out of range') from None
+        self._last_id += 1
+        new_task = Task(text, category, priority, deadline, id=self._last_id)
+        self.by_id[new_task.id] = new_task
+        if self._view is not None:
+            self._view.append(new_task)
+        if self.index is not None:
+            self.index.add(new_task)
+        if self.search_index is not None:
+            self.search_index.add(new_task)
+        if self.stats is not None:
+            self.stats.add(new_task)
+        self.scheduler.add(new_task)
+        self._record('add', new_task)
+
+        logging.info('Task added: %s, Category: %s, Priority: %s, Deadline: %s',
+                     new_task.text, new_task.category, new_task.priority, format_date(new_task.deadline))
+        return new_task
+
+
+
+
+    def import_tasks(self, tasks):
+        # Read everything first, so a bad row leaves the list untouched.
+        imported = list(tasks)
+        for task in imported:
+            self._last_id += 1
+            task.id = self._last_id
+            self.by_id[task.id] = task
+        if self._view is not None:
+            self._view.extend(imported)
+        if self.index is not None:
+            self.index.extend(imported)
+        if self.search_index is not None:
+            self.search_index.extend(imported)
+        if self.stats is not None:
+            for task in imported:
+                self.stats.add(task)
+        self.scheduler.extend(imported)
+        self._record_many([('add', task) for task in imported])
+
+        logging.info("Imported %s tasks", len(imported))
+        return len(imported)
+
+
+
+
+    def remove_tasks(self, ids):
+        removed = []
+        for task_id in dict.fromkeys(ids):
+            task = self.by_id.pop(task_id, None)
+            if task is not None:
+                if self.index is not None:
+                    self.index.remove(task)
+                if self.search_index is not None:
+                    self.search_index.remove(task)
+                if self.stats is not None:
+                    self.stats.remove(task)
+                self.scheduler.discard(task)
+                removed.append(task)
+        if removed:
+            self._view = None
+
+        self._record_many([('delete', task) for task in removed])
+        logging.info("Deleted %s task(s)", len(removed))
+        return removed
+
+
+
+
+    def complete_tasks(self, ids):
+        completed = []
+        for task_id in dict.fromkeys(ids):
+            task = self.by_id.get(task_id)
+            if task is not None and not task.done:
+                if self.index is not None:
+                    self.index.complete(task)
+                if self.stats is not None:
+                    self.stats.complete(task)
+                self.scheduler.discard(task)
+                task.done = True
+                completed.append(task)
+
+        self._record_many([('complete', task) for task in completed])
+        logging.info("Completed %s task(s)", len(completed))
+        return completed
+
+
+
+
+    def unknown_ids(self, ids):
+        return [task_id for task_id in ids if task_id not in self.by_id]
+
+
+
+
+    def task_count(self):
+        return len(self.by_id)
+
+
+
+
+    def query(self, category=None, priority=None, done=None, due_before=None, text_contains=None, sort=None,
+              limit=None, due_from=None):
+        # Returns a lazy iterator over matching tasks, sorted by a SORT_KEYS name
+        # (prefixed with '-' for descending) and cut to limit. The arguments are
+        # checked and the plan is made now; tasks are read as the caller iterates.
+        # Deadlines fall in [due_from, due_before), both date ordinals.
+        if sort is not None:
+            sort_key(sort)
+        if limit is not None and limit < 0:
+            raise ValueError('Limit must not be negative')
+        criteria = dict(category=category, priority=priority, done=done, due_before=due_before,
+                        due_from=due_from, text_contains=text_contains)
+
+        if self.index is None:
+            matches = self.storage.query(self.by_id, sort=sort, limit=limit, **criteria)
+            if self.metrics is not None:
+                self.metrics.add_scan('query', self.storage.last_scanned, len(matches))
+            return iter(matches)
+
+        ids, presorted = self.index.plan(category, priority, done, due_before, sort, limit, due_from)
+        logging.debug("Query plan: %s index, sort=%s, limit=%s", self.index.last_plan, sort, limit)
+        candidates = self.tasks if ids is None else map(self.by_id.__getitem__, ids)
+        return self._scan(candidates, criteria, None if presorted else sort, limit)
+
+
+
+
+    def _scan(self, candidates, criteria, sort, limit):
+        scanned = returned = 0
+
+        def counted():
+            nonlocal scanned
+            for task in candidates:
+                scanned += 1
+                yield task
+
+        source = candidates if self.metrics is None else counted()
+        try:
+            for task in order_tasks(iter_matches(source, **criteria), sort, limit):
+                returned += 1
+                yield task
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_scan('query', scanned, returned)
+
+
+
+
+    def _data_stamp(self):
+        # sidecar files are only reused for exactly this task data
+        return [self._generation, list(self._signature) if self._signature else None]
+
+
+
+
+    def _searcher(self):
+        if self.search_index is None:
+            from search import SearchIndex
+            self.search_index = SearchIndex()
+            if not self.search_index.load(self.search_path, self._data_stamp()):
+                self.search_index.rebuild(self.tasks)
+        return self.search_index
+
+
+
+
+    def search(self, text, limit=None):
+        # Ranked full-text search; on equal scores open tasks come first.
+        index = self._searcher()
+        results = index.search(text, limit, rank=lambda task_id: self.by_id[task_id].done)
+        if self.metrics is not None:
+            self.metrics.add_scan('search', index.last_scanned, len(results))
+        return [self.by_id[task_id] for _, task_id in results]
+
+
+
+
+    def statistics(self):
+        # Summary of the task counters. Before anything is loaded, counters
+        # saved for the current file are used without reading the tasks.
+        if self.stats is None and self._generation is None:
+            with self.storage.lock.shared():
+                signature = self.storage.signature()
+                self._load_stats([self.storage.generation(), list(signature) if signature else None])
+            if self.stats is None:
+                self.load_data()
+        if self.stats is None:
+            from stats import TaskStats
+            self.stats = TaskStats()
+            self.stats.rebuild(self.tasks)
+        return self.stats.summary()
+
+
+
+
+    def _load_stats(self, stamp):
+        from stats import TaskStats
+        stats = TaskStats()
+        if stats.load(self.stats_path, stamp):
+            self.stats = stats
+
+
+
+
+    def overdue_tasks(self):
+        # open tasks past their deadline, earliest first
+        return [self.by_id[task_id] for task_id in self.scheduler.overdue_ids()]
+
+
+
+
+    def due_within(self, days):
+        # open tasks due from today up to today + days, earliest first
+        return [self.by_id[task_id] for task_id in self.scheduler.due_within(days)]
+
+
+
+
+    def start_reminders(self):
+        if self.reminder is None:
+            from scheduler import Reminder
+            self.scheduler.on_overdue = self._remind
+            self.reminder = Reminder(self.scheduler)
+            self.reminder.start()
+
+
+
+
+    def _remind(self, ids):
+        for task_id in ids:
+            task = self.by_id.get(task_id)
+            if task is not None:
+                print(f'\nReminder: task "{task.text}" is now overdue (deadline {format_date(task.deadline)}).')
+                logging.warning('Task "%s" is now overdue', task.text)
+
+
+
+
+    def close(self):
+        if self.reminder is not None:
+            self.reminder.stop()
+            self.reminder = None
+        # Completions change no words, but they do change the task data the
+        # file was stamped with, so any write since loading means a new save.
+        if self.search_index is not None and self.search_index.stamp != self._data_stamp():
+            self.search_index.save(self.search_path, self._data_stamp())
+        if self.stats is not None and self._generation is not None and self.stats.stamp != self._data_stamp():
+            self.stats.save(self.stats_path, self._data_stamp())
+        self.storage.close()
+
+
+
+
+    def add_task(self):
+        try:
+            input_new_task_text = input('Input new task text or exit: ').strip()
+            logging.debug("User entered task text: '%s'", input_new_task_text)
+
+            if input_new_task_text.lower() == 'exit':
+                print('Returning to menu...')
+                logging.info('User exited task addition.')
+                return
+
+            input_new_task_category = input('Input new task category: ').strip()
+            logging.debug('User entered task category: "%s"', input_new_task_category)
+
+            print('Input new task priority:\n[1] Low\n[2] Medium\n[3] High')
+            input_priority_choice = int(input('> '))
+            logging.debug("User selected priority option: %s", input_priority_choice)
+
+            if input_priority_choice in range(1, 4):
+                if input_priority_choice == 1:
+                    selected_priority_level = 'Low'
+                elif input_priority_choice == 2:
+                    selected_priority_level = 'Medium'
+                else:
+                    selected_priority_level = 'High'
+                logging.debug("Mapped priority level: %s", selected_priority_level)
+            else:
+                print('Error: Input out of range.')
+                logging.warning("Invalid priority input: %s", input_priority_choice)
+                return
+
+            input_days_until_deadline = int(input('Input days until deadline: '))
+            logging.debug("User entered deadline in days: %s", input_days_until_deadline)
+
+            new_task = self.create_task(input_new_task_text, input_new_task_category, selected_priority_level,
+                                        input_days_until_deadline)
+            print(f'Task "{new_task.text}" added!')
+
+
+        except ValueError as e:
+            print('Error: Invalid input.')
+            logging.error('ValueError in add_task: %s', e)
+
+
+
+
+    def delete_task(self):
+        if self.task_count() == 0:
+            print('Error: Task list is empty.')
+            logging.warning('Attempted to delete task, but task list was empty.')
+            return
+
+        logging.debug("Task list loaded with %s tasks.", len(self.tasks))
+
+        render_table('Task list', self.tasks)
+
+        input_index = input('\nEnter the task number to delete or exit: ').strip()
+        logging.debug("User entered index: %s", input_index)
+
+        if input_index.lower() == 'exit':
+            print('Returning to menu...')
+            logging.info('User cancelled task deletion (exit).')
+            return
+
+        try:
+            selected_task = self.by_id.get(int(input_index))
+            if selected_task is not None:
+                logging.debug("Selected task for deletion: %s", selected_task.text)
+                input_choice = input(f'Are you sure to delete this task "{selected_task.text}" ? (y/n): ')
+                logging.debug("User confirmation: %s", input_choice)
+
+                if input_choice.lower() == 'n' or input_choice.lower() == 'no':
+                    print('Returning to menu...')
+                    logging.info('Task deletion of "%s" cancelled by user.', selected_task.text)
+                    return
+                else:
+                    deleted_task, = self.remove_tasks([selected_task.id])
+                    print('The selected task has been deleted!')
+                    logging.info('Task "%s" was successfully deleted.', deleted_task.text)
+
+            else:
+                print('Error: Invalid input.')
+                logging.warning('User tried to delete invalid task index: %s', input_index)
+
+        except ValueError as e:
+            print('Error: Invalid input.')
+            logging.error('ValueError while parsing input index: %s, Exception: %s', input_index, e)
+
+
+
+
+    def _page(self, start, size):
+        return self.tasks[start:start + size]
+
+
+
+
+    def show_tasks(self, page_size=PAGE_SIZE, stream=False):
+        if stream:
+            pager = StreamPager(self.storage)
+            fetch_page = pager.page
+            total_pages = None
+        else:
+            if self.task_count() == 0:
+                print('Error: Task list is empty.')
+                logging.warning("User attempted to view tasks, but task list is empty")
+                return
+
+            fetch_page = self._page
+            total_pages = -(-self.task_count() // page_size)
+
+        logging.info("Displaying tasks, %s per page, stream=%s", page_size, stream)
+
+        page = 0
+        rows = fetch_page(0, page_size)
+        if not rows:
+            print('Error: Task list is empty.')
+            logging.warning("User attempted to view tasks, but task list is empty")
+            return
+
+        while True:
+            if total_pages is None:
+                render_table(f'Tasks list (page {page + 1})', rows)
+            else:
+                render_table(f'Tasks list (page {page + 1} of {total_pages})', rows)
+
+            input_choice = input('\n[n] Next page  [p] Previous page  [number] Go to page  [q] Back to menu\n> ').strip().lower()
+            logging.debug("User entered page command: %s", input_choice)
+
+            if input_choice in ('q', 'exit'):
+                print('Returning to menu...')
+                return
+            elif input_choice == 'n':
+                new_page = page + 1
+            elif input_choice == 'p':
+                new_page = page - 1
+            elif input_choice.isdigit():
+                new_page = int(input_choice) - 1
+            else:
+                print('Error: Invalid input.')
+                continue
+
+            if new_page < 0 or (total_pages is not None and new_page >= total_pages):
+                print('Error: Page out of range.')
+                logging.warning("Page out of range: %s", new_page + 1)
+                continue
+
+            new_rows = fetch_page(new_page * page_size, page_size)
+            if not new_rows:
+                print('Error: Page out of range.')
+                logging.warning("Page out of range: %s", new_page + 1)
+                continue
+
+            page, rows = new_page, new_rows
+
+
+
+
+    def complete_task(self):
+        if self.task_count() == 0:
+            print('Error: Task list is empty.')
+            logging.warning("Cannot complete task — list is empty")
+            return
+
+        uncompleted_tasks = list(self.query(done=False))
+
+        if not uncompleted_tasks:
+            print('Error: Uncompleted tasks list is empty.')
+            logging.warning("No uncompleted tasks found")
+            return
+
+        logging.info("User is viewing %s uncompleted tasks", len(uncompleted_tasks))
+
+        render_table('List of uncompleted tasks', uncompleted_tasks)
+
+        input_index = input('\nEnter the task number to complete or exit: ').strip()
+        if input_index.lower() == 'exit':
+            print('Returning to menu...')
+            logging.debug("User exited from task completion prompt")
+            return
+
+        try:
+            selected_task = self.by_id.get(int(input_index))
+            if selected_task is not None:
+                input_choice = input(f'Are you sure to complete this task "{selected_task.text}" ? (y/n): ')
+                if input_choice.lower() == 'n' or input_choice.lower() == 'no':
+                    print('Returning to menu...')
+                    logging.debug('User canceled completion of task: "%s"', selected_task.text)
+                    return
+                else:
+                    self.complete_tasks([selected_task.id])
+                    print('The selected task has been completed!')
+                    logging.info('Task marked as completed: "%s"', selected_task.text)
+
+
+            else:
+                print('Error: Invalid input.')
+                logging.warning('Invalid task number entered: %s', input_index)
+
+        except ValueError:
+            print('Error: Invalid input.')
+            logging.error('ValueError during task completion — input was: "%s"', input_index)
+
+
+
+
+    def find_by_category(self):
+        if self.task_count() == 0:
+            print('Error: Task list is empty.')
+            logging.warning("Cannot search by category — task list is empty")
+            return
+
+        input_category = input('\nEnter the task category to search for: ').strip()
+        logging.info("User is searching for tasks in category: %s", input_category)
+
+        tasks_in_input_category = list(self.query(category=input_category))
+
+        if not tasks_in_input_category:
+            print('Error: No tasks in the given category.')
+            logging.warning('No tasks found in category: %s', input_category)
+            return
+
+        logging.info("Found %s task(s) in category '%s'", len(tasks_in_input_category), input_category)
+
+        render_table('List of tasks in the given category', tasks_in_input_category)
+
+
+
+
+    def find_by_priority(self):
+        if self.task_count() == 0:
+            print('Error: Task list is empty.')
+            logging.warning("Cannot search by priority — task list is empty")
+            return
+
+        try:
+            print('Select a priority level')
+            print('[1] Low\n[2] Medium\n[3] High')
+
+            input_choice = int(input('> '))
+            logging.debug("User selected priority option: %s", input_choice)
+
+            if input_choice in range(1, 4):
+                if input_choice == 1:
+                    input_priority = 'Low'
+                elif input_choice == 2:
+                    input_priority = 'Medium'
+                else:
+                    input_priority = 'High'
+
+            else:
+                print('Error: Input out of range.')
+                logging.warning("Priority selection out of range: %s", input_choice)
+                return
+
+            logging.info("User is searching tasks with priority: %s", input_priority)
+
+            tasks_with_input_priority = list(self.query(priority=input_priority))
+
+            if not tasks_with_input_priority:
+                print('Error: No tasks in the given priority level.')
+                logging.warning("No tasks found with priority: %s", input_priority)
+                return
+
+            logging.info('Found %s task(s) with priority "%s"', len(tasks_with_input_priority), input_priority)
+
+            render_table('List of tasks in the given priority level', tasks_with_input_priority)
+
+        except ValueError as e:
+            print('Error: Invalid input.')
+            logging.error("ValueError during priority input: %s", e)
+
+
+
+
+    def find_overdue_tasks(self):
+        if self.task_count() == 0:
+            print('Error: Task list is empty.')
+            logging.warning("Cannot search for overdue tasks — task list is empty")
+            return
+
+        overdue_tasks = self.overdue_tasks()
+
+        if not overdue_tasks:
+            print('Error: No overdue tasks found.')
+            logging.info("No overdue tasks found")
+            return
+
+        logging.info("Found %s overdue task(s)", len(overdue_tasks))
+
+        render_table('List of overdue tasks', overdue_tasks)
+
+
+
+
+    def find_due_soon(self):
+        if self.task_count() == 0:
+            print('Error: Task list is empty.')
+            logging.warning("Cannot search for upcoming tasks — task list is empty")
+            return
+
+        try:
+            input_days = int(input('\nShow open tasks due within how many days: '))
+            if input_days < 0:
+                print('Error: Input out of range.')
+                logging.warning("Negative number of days entered: %s", input_days)
+                return
+
+            due_tasks = self.due_within(input_days)
+
+            if not due_tasks:
+                print('Error: No tasks due in that time.')
+                logging.info("No tasks due within %s days", input_days)
+                return
+
+            logging.info("Found %s task(s) due within %s days", len(due_tasks), input_days)
+
+            render_table(f'List of tasks due within {input_days} days', due_tasks)
+
+        except ValueError as e:
+            print('Error: Invalid input.')
+            logging.error("ValueError during days input: %s", e)
+
+
+
+
+    def show_statistics(self):
+        if self.task_count() == 0:
+            print('Error: Task list is empty.')
+            logging.warning("Cannot show statistics — task list is empty")
+            return
+
+        summary = self.statistics()
+        logging.info("Showing statistics for %s task(s)", summary['total'])
+
+        render_statistics(summary)
+
+
+
+
+    def search_tasks(self):
+        if self.task_count() == 0:
+            print('Error: Task list is empty.')
+            logging.warning("Cannot search tasks — task list is empty")
+            return
+
+        input_text = input('\nEnter words to search for: ').strip()
+        logging.info("User is searching tasks for: %s", input_text)
+
+        found_tasks = self.search(input_text)
+
+        if not found_tasks:
+            print('Error: No matching tasks found.')
+            logging.info('No tasks found for: %s', input_text)
+            return
+
+        logging.info("Found %s task(s) for '%s'", len(found_tasks), input_text)
+
+        render_table('Search results', found_tasks)